@@ -62,7 +62,8 @@ CREATE TABLE IF NOT EXISTS biometric_alerts (
   timestamp TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
   resolved BOOLEAN DEFAULT FALSE,
   action_taken TEXT,
-  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
 -- Emotion records table
@@ -74,7 +75,8 @@ CREATE TABLE IF NOT EXISTS emotion_records (
   timestamp TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
   triggers TEXT[] DEFAULT '{}',
   context TEXT,
-  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
 -- Therapy sessions table
@@ -87,7 +89,10 @@ CREATE TABLE IF NOT EXISTS therapy_sessions (
   status VARCHAR(20) CHECK (status IN ('active', 'paused', 'completed', 'cancelled')) DEFAULT 'active',
   objectives TEXT[] DEFAULT '{}',
   notes TEXT,
-  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+  summary JSONB, -- emotional summary frozen when the session is completed
+  summary_checkpoint JSONB, -- running aggregate counters saved when the session is paused
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
 -- Emotional islands table
@@ -100,15 +105,38 @@ CREATE TABLE IF NOT EXISTS emotional_islands (
   visit_count INTEGER DEFAULT 0,
   last_visit TIMESTAMP WITH TIME ZONE,
   progress JSONB DEFAULT '{}',
-  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Cache generations: bumped by the API whenever a user's cached responses or
+-- identity change, so every API worker drops its stale copies
+CREATE TABLE IF NOT EXISTS cache_generations (
+  id UUID PRIMARY KEY, -- user id
+  generation UUID NOT NULL,
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Columns added after the initial release (CREATE TABLE IF NOT EXISTS skips existing tables)
+ALTER TABLE therapy_sessions ADD COLUMN IF NOT EXISTS summary JSONB;
+ALTER TABLE therapy_sessions ADD COLUMN IF NOT EXISTS summary_checkpoint JSONB;
+ALTER TABLE biometric_alerts ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+ALTER TABLE emotion_records ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+ALTER TABLE therapy_sessions ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+ALTER TABLE emotional_islands ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW();
+
 -- Create indexes for better performance
 CREATE INDEX IF NOT EXISTS idx_biometric_data_child_timestamp ON biometric_data(child_id, timestamp DESC);
 CREATE INDEX IF NOT EXISTS idx_biometric_alerts_child_timestamp ON biometric_alerts(child_id, timestamp DESC);
 CREATE INDEX IF NOT EXISTS idx_emotion_records_child_timestamp ON emotion_records(child_id, timestamp DESC);
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_children_psychologist ON children(assigned_psychologist);
+CREATE INDEX IF NOT EXISTS idx_therapy_sessions_child_status ON therapy_sessions(child_id, status);
+-- Delta sync reads each table by (child_id, updated_at)
+CREATE INDEX IF NOT EXISTS idx_biometric_alerts_child_updated ON biometric_alerts(child_id, updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_emotion_records_child_updated ON emotion_records(child_id, updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_therapy_sessions_child_updated ON therapy_sessions(child_id, updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_emotional_islands_child_updated ON emotional_islands(child_id, updated_at, id);
 
 -- Enable Row Level Security
 ALTER TABLE users ENABLE ROW LEVEL SECURITY;
@@ -179,6 +207,18 @@ $$ LANGUAGE plpgsql;
 CREATE TRIGGER update_users_updated_at BEFORE UPDATE ON users
     FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
+CREATE TRIGGER update_biometric_alerts_updated_at BEFORE UPDATE ON biometric_alerts
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TRIGGER update_emotion_records_updated_at BEFORE UPDATE ON emotion_records
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TRIGGER update_therapy_sessions_updated_at BEFORE UPDATE ON therapy_sessions
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+CREATE TRIGGER update_emotional_islands_updated_at BEFORE UPDATE ON emotional_islands
+    FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
 -- Sample data for testing
 INSERT INTO users (id, name, email, role) VALUES 
   ('11111111-1111-1111-1111-111111111111', 'Dr. María González', 'maria.gonzalez@mindbridge.com', 'psychologist'),
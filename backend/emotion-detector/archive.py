@@ -0,0 +1,309 @@
+import fcntl
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from database import DatabaseService
+
+# Root directory of the compacted archives:
+#   <ARCHIVE_DIR>/<table>/<child_id>/<tier>/<YYYY-MM-DD>.npz
+ARCHIVE_DIR = os.getenv("ARCHIVE_DIR", "archive")
+# Raw rows older than this are compacted out of the hot tables.
+ARCHIVE_HOT_RETENTION_HOURS = float(os.getenv("ARCHIVE_HOT_RETENTION_HOURS", "24"))
+# Per-second buckets are kept this long; older history is only kept per minute.
+ARCHIVE_SECOND_TIER_DAYS = int(os.getenv("ARCHIVE_SECOND_TIER_DAYS", "30"))
+# How often the background compaction runs.
+ARCHIVE_INTERVAL_SECONDS = float(os.getenv("ARCHIVE_INTERVAL_SECONDS", "3600"))
+# Rows fetched from the hot table per compaction round trip.
+ARCHIVE_BATCH_SIZE = 1000
+
+TIERS = {"second": 1, "minute": 60}
+
+# Categorical columns are stored as per-bucket counts so partial buckets from
+# successive compaction runs can be merged exactly.
+EMOTIONS = ["joy", "sadness", "anger", "fear", "disgust", "neutral"]
+STRESS_LEVELS = ["low", "medium", "high"]
+ACTIVITIES = ["resting", "active", "excited", "agitated"]
+
+# Lock file (inside ARCHIVE_DIR) held while compacting.
+COMPACTION_LOCK_NAME = ".compaction.lock"
+
+
+def parse_timestamp(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        ts = value
+    else:
+        ts = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts
+
+
+def _iso(epoch: int) -> str:
+    return datetime.fromtimestamp(int(epoch), tz=timezone.utc).isoformat()
+
+
+def _code(values: List[str], value: str) -> int:
+    try:
+        return values.index(value)
+    except ValueError:
+        return len(values) - 1 if values is EMOTIONS else 0
+
+
+def _day_path(table: str, child_id: str, tier: str, day: str) -> str:
+    return os.path.join(ARCHIVE_DIR, table, str(child_id), tier, day + ".npz")
+
+
+def _load(path: str) -> Optional[Dict[str, np.ndarray]]:
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as data:
+        return {key: data[key] for key in data.files}
+
+
+def _save(path: str, columns: Dict[str, np.ndarray]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(f, **columns)
+    # Readers never see a partially written archive
+    os.replace(tmp_path, path)
+
+
+# Per-table column layouts: summed columns, min columns and max columns.
+# Every table also has "ts" (bucket start, epoch seconds) and "count", plus the
+# META_COLUMNS below.
+LAYOUTS = {
+    "emotion_records": {
+        "sum": ["intensity_sum", "emotion_counts"],
+        "min": ["intensity_min"],
+        "max": ["intensity_max"],
+    },
+    "biometric_data": {
+        "sum": ["heart_rate_sum", "skin_temperature_sum", "stress_counts", "activity_counts"],
+        "min": ["heart_rate_min"],
+        "max": ["heart_rate_max"],
+    },
+}
+
+
+def _bucketize(table: str, rows: List[Dict[str, Any]], width: int) -> Dict[str, np.ndarray]:
+    epochs = np.array([int(parse_timestamp(row["timestamp"]).timestamp()) for row in rows], dtype=np.int64)
+    buckets = epochs - epochs % width
+    ts, index = np.unique(buckets, return_inverse=True)
+    n = len(ts)
+    columns = {"ts": ts, "count": np.bincount(index, minlength=n).astype(np.int32)}
+
+    if table == "emotion_records":
+        intensity = np.array([row["intensity"] for row in rows], dtype=np.float64)
+        codes = np.array([_code(EMOTIONS, row["emotion"]) for row in rows], dtype=np.int64)
+        columns["intensity_sum"] = np.bincount(index, weights=intensity, minlength=n)
+        columns["intensity_min"] = np.full(n, np.inf)
+        np.minimum.at(columns["intensity_min"], index, intensity)
+        columns["intensity_max"] = np.full(n, -np.inf)
+        np.maximum.at(columns["intensity_max"], index, intensity)
+        columns["emotion_counts"] = np.zeros((n, len(EMOTIONS)), dtype=np.int32)
+        np.add.at(columns["emotion_counts"], (index, codes), 1)
+    else:
+        heart_rate = np.array([row["heart_rate"] for row in rows], dtype=np.float64)
+        temperature = np.array([float(row["skin_temperature"]) for row in rows], dtype=np.float64)
+        stress = np.array([_code(STRESS_LEVELS, row["stress_level"]) for row in rows], dtype=np.int64)
+        activity = np.array([_code(ACTIVITIES, row["activity"]) for row in rows], dtype=np.int64)
+        columns["heart_rate_sum"] = np.bincount(index, weights=heart_rate, minlength=n)
+        columns["heart_rate_min"] = np.full(n, np.inf)
+        np.minimum.at(columns["heart_rate_min"], index, heart_rate)
+        columns["heart_rate_max"] = np.full(n, -np.inf)
+        np.maximum.at(columns["heart_rate_max"], index, heart_rate)
+        columns["skin_temperature_sum"] = np.bincount(index, weights=temperature, minlength=n)
+        columns["stress_counts"] = np.zeros((n, len(STRESS_LEVELS)), dtype=np.int32)
+        np.add.at(columns["stress_counts"], (index, stress), 1)
+        columns["activity_counts"] = np.zeros((n, len(ACTIVITIES)), dtype=np.int32)
+        np.add.at(columns["activity_counts"], (index, activity), 1)
+    return columns
+
+
+def _merge(table: str, existing: Dict[str, np.ndarray], new: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    layout = LAYOUTS[table]
+    ts, index = np.unique(np.concatenate([existing["ts"], new["ts"]]), return_inverse=True)
+    n = len(ts)
+    old_index, new_index = index[:len(existing["ts"])], index[len(existing["ts"]):]
+    merged = {"ts": ts}
+    for key in ["count"] + layout["sum"]:
+        column = np.zeros((n,) + existing[key].shape[1:], dtype=existing[key].dtype)
+        np.add.at(column, old_index, existing[key])
+        np.add.at(column, new_index, new[key])
+        merged[key] = column
+    for key in layout["min"]:
+        column = np.full(n, np.inf)
+        np.minimum.at(column, old_index, existing[key])
+        np.minimum.at(column, new_index, new[key])
+        merged[key] = column
+    for key in layout["max"]:
+        column = np.full(n, -np.inf)
+        np.maximum.at(column, old_index, existing[key])
+        np.maximum.at(column, new_index, new[key])
+        merged[key] = column
+    return merged
+
+
+# Every archive file records the ids of merged rows that may still be in the hot
+# table (the process can die between archiving and deleting them), in the same
+# atomic write as the buckets. Exactly those rows are skipped on the next merge;
+# ids already deleted from the hot table are dropped, so the set stays small.
+META_COLUMNS = ("merged_ids",)
+
+
+def _write_rows(table: str, child_id: str, rows: List[Dict[str, Any]]):
+    by_day: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        by_day.setdefault(parse_timestamp(row["timestamp"]).strftime("%Y-%m-%d"), []).append(row)
+
+    for day, day_rows in by_day.items():
+        for tier, width in TIERS.items():
+            path = _day_path(table, child_id, tier, day)
+            existing = _load(path)
+            merged_ids = set(existing["merged_ids"].tolist()) if existing is not None and "merged_ids" in existing else set()
+            new_rows = [row for row in day_rows if str(row["id"]) not in merged_ids]
+            if not new_rows:
+                continue
+            if merged_ids:
+                merged_ids = set(DatabaseService.get_existing_ids(table, sorted(merged_ids)))
+            columns = _bucketize(table, new_rows, width)
+            if existing is not None:
+                columns = _merge(table, existing, columns)
+            columns["merged_ids"] = np.array(sorted(merged_ids | {str(row["id"]) for row in new_rows}))
+            _save(path, columns)
+
+
+def _prune_second_tier(table: str, child_id: str, now: datetime):
+    tier_dir = os.path.join(ARCHIVE_DIR, table, str(child_id), "second")
+    if not os.path.isdir(tier_dir):
+        return
+    oldest_kept = (now - timedelta(days=ARCHIVE_SECOND_TIER_DAYS)).strftime("%Y-%m-%d")
+    for name in os.listdir(tier_dir):
+        if name.endswith(".npz") and name[:-4] < oldest_kept:
+            os.remove(os.path.join(tier_dir, name))
+
+
+HOT_TABLES = {
+    "emotion_records": (DatabaseService.get_emotion_records_before, DatabaseService.delete_emotion_records),
+    "biometric_data": (DatabaseService.get_biometric_data_before, DatabaseService.delete_biometric_data),
+}
+
+
+def compact_child(child_id: str, now: Optional[datetime] = None) -> Dict[str, int]:
+    """Moves a child's raw rows older than the hot retention window into the archive."""
+    now = now or datetime.now(timezone.utc)
+    cutoff = now - timedelta(hours=ARCHIVE_HOT_RETENTION_HOURS)
+    compacted = {}
+    for table, (fetch, delete) in HOT_TABLES.items():
+        compacted[table] = 0
+        while True:
+            rows = fetch(child_id, cutoff.isoformat(), ARCHIVE_BATCH_SIZE)
+            if not rows:
+                break
+            # Archive first: a crash before the delete leaves the rows in the hot
+            # table, and the archive's merged ids skip them on the next run
+            _write_rows(table, child_id, rows)
+            deleted = delete([row["id"] for row in rows])
+            compacted[table] += deleted
+            # Rows that could not be deleted would be fetched again forever
+            if len(rows) < ARCHIVE_BATCH_SIZE or deleted < len(rows):
+                break
+        _prune_second_tier(table, child_id, now)
+    return compacted
+
+
+def compact_all() -> Dict[str, int]:
+    totals = {table: 0 for table in HOT_TABLES}
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    with open(os.path.join(ARCHIVE_DIR, COMPACTION_LOCK_NAME), "a") as lock_file:
+        # A slow run must not overlap with the next scheduled one, nor with
+        # another uvicorn worker's loop
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return totals
+        try:
+            for child_id in DatabaseService.get_child_ids():
+                for table, count in compact_child(child_id).items():
+                    totals[table] += count
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return totals
+
+
+def _to_rows(table: str, child_id: str, tier: str, columns: Dict[str, np.ndarray]) -> List[Dict[str, Any]]:
+    rows = []
+    for i in range(len(columns["ts"]) - 1, -1, -1):
+        count = int(columns["count"][i])
+        timestamp = _iso(columns["ts"][i])
+        row = {
+            # Stable id so clients can key archived buckets across polls
+            "id": str(uuid.uuid5(uuid.NAMESPACE_URL, f"{table}/{child_id}/{tier}/{int(columns['ts'][i])}")),
+            "child_id": str(child_id),
+            "timestamp": timestamp,
+            "created_at": timestamp,
+            # One archived row summarises `count` raw samples
+            "tier": tier,
+            "count": count,
+        }
+        if table == "emotion_records":
+            row["emotion"] = EMOTIONS[int(np.argmax(columns["emotion_counts"][i]))]
+            row["intensity"] = int(round(columns["intensity_sum"][i] / count))
+            row["triggers"] = []
+            row["context"] = f"archive:{tier}"
+        else:
+            row["heart_rate"] = int(round(columns["heart_rate_sum"][i] / count))
+            row["skin_temperature"] = round(float(columns["skin_temperature_sum"][i] / count), 2)
+            row["stress_level"] = STRESS_LEVELS[int(np.argmax(columns["stress_counts"][i]))]
+            row["activity"] = ACTIVITIES[int(np.argmax(columns["activity_counts"][i]))]
+        rows.append(row)
+    return rows
+
+
+def read_archive(table: str, child_id: str, before: Optional[datetime], limit: int) -> List[Dict[str, Any]]:
+    """Returns up to `limit` archived rows older than `before`, newest first.
+
+    Per-second buckets are used where they still exist; older days fall back to per-minute buckets.
+    """
+    if limit <= 0:
+        return []
+    child_dir = os.path.join(ARCHIVE_DIR, table, str(child_id))
+    second_days = set()
+    if os.path.isdir(os.path.join(child_dir, "second")):
+        second_days = {name[:-4] for name in os.listdir(os.path.join(child_dir, "second")) if name.endswith(".npz")}
+    minute_days = set()
+    if os.path.isdir(os.path.join(child_dir, "minute")):
+        minute_days = {name[:-4] for name in os.listdir(os.path.join(child_dir, "minute")) if name.endswith(".npz")}
+
+    before_epoch = before.timestamp() if before else None
+    rows: List[Dict[str, Any]] = []
+    for day in sorted(second_days | minute_days, reverse=True):
+        if before is not None and day > before.strftime("%Y-%m-%d"):
+            continue
+        tier = "second" if day in second_days else "minute"
+        columns = _load(_day_path(table, child_id, tier, day))
+        if columns is None:
+            continue
+        columns = {key: value for key, value in columns.items() if key not in META_COLUMNS}
+        if before_epoch is not None:
+            keep = columns["ts"] < before_epoch
+            columns = {key: value[keep] for key, value in columns.items()}
+        rows.extend(_to_rows(table, child_id, tier, columns))
+        if len(rows) >= limit:
+            break
+    return rows[:limit]
+
+
+def read_history(table: str, child_id: str, hot_rows: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    """Extends a newest-first page from the hot table with archived rows when it is short."""
+    for row in hot_rows:
+        row["tier"], row["count"] = "raw", 1
+    if len(hot_rows) >= limit:
+        return hot_rows
+    before = parse_timestamp(hot_rows[-1]["timestamp"]) if hot_rows else None
+    return hot_rows + read_archive(table, child_id, before, limit - len(hot_rows))
@@ -2,11 +2,12 @@ from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, WebSocket, WebSocketException, status
 from fastapi.security import OAuth2PasswordBearer
 from models import User, TokenData
 import os
 from database import DatabaseService
+from cache import user_cache
 
 # JWT settings
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
@@ -40,7 +41,8 @@ def authenticate_user(email: str, password: str):
         return False
     return user
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
+def resolve_identity(token: str):
+    """Resolves a token to the user row with its role profile under "child" / "psychologist"."""
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -55,7 +57,59 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except JWTError:
         raise credentials_exception
 
-    user = DatabaseService.get_user_by_email(token_data.email)
+    user = user_cache.get(token_data.email)
     if user is None:
-        raise credentials_exception
+        user = DatabaseService.get_user_with_profile(token_data.email)
+        if user is None:
+            raise credentials_exception
+        # Cache the profile read after the generation, so a concurrent write can
+        # never be stored under the newer generation
+        generation = DatabaseService.get_cache_generation(str(user["id"]))
+        user = DatabaseService.get_user_with_profile(token_data.email)
+        if user is None:
+            raise credentials_exception
+        user_cache.put(token_data.email, user, generation)
     return user
+
+# FastAPI caches dependency results per request, so handlers that depend on
+# several of these still resolve the identity only once.
+async def get_current_user(token: str = Depends(oauth2_scheme)):
+    return resolve_identity(token)
+
+async def get_current_child(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "child":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if not current_user.get("child"):
+        raise HTTPException(status_code=404, detail="Child profile not found")
+    return current_user["child"]
+
+async def get_current_psychologist(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "psychologist":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if not current_user.get("psychologist"):
+        raise HTTPException(status_code=404, detail="Psychologist profile not found")
+    return current_user["psychologist"]
+
+# Browsers cannot set headers on WebSocket handshakes, so they offer the token as
+# a second subprotocol ("bearer", <token>); unlike a query parameter it never
+# ends up in access logs
+WEBSOCKET_AUTH_SUBPROTOCOL = "bearer"
+
+def websocket_subprotocol(websocket: WebSocket) -> Optional[str]:
+    # Browsers drop the connection unless the server echoes one of the offered subprotocols
+    return WEBSOCKET_AUTH_SUBPROTOCOL if WEBSOCKET_AUTH_SUBPROTOCOL in websocket.scope.get("subprotocols", []) else None
+
+async def get_websocket_user(websocket: WebSocket):
+    token = None
+    authorization = websocket.headers.get("authorization", "")
+    protocols = websocket.scope.get("subprotocols", [])
+    if authorization.lower().startswith("bearer "):
+        token = authorization[7:]
+    elif len(protocols) == 2 and protocols[0] == WEBSOCKET_AUTH_SUBPROTOCOL:
+        token = protocols[1]
+    if not token:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason="Not authenticated")
+    try:
+        return resolve_identity(token)
+    except HTTPException as e:
+        raise WebSocketException(code=status.WS_1008_POLICY_VIOLATION, reason=e.detail)
@@ -0,0 +1,138 @@
+import hashlib
+import os
+import threading
+import time
+from email.utils import formatdate
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+from database import DatabaseService
+from serialization import dumps
+
+# How long cached entries are trusted without an explicit invalidation.
+# Bounds staleness for writes that bypass this API (e.g. direct Supabase access).
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "300"))
+
+# Invalidation has to reach every API worker, so each owner (user id) has a
+# generation in the cache_generations table. Writes bump it; entries cached
+# under an older generation are discarded by whichever worker holds them.
+
+
+class CacheEntry:
+    def __init__(self, body: bytes, generation: Optional[str]):
+        self.body = body
+        self.generation = generation
+        self.etag = '"%s"' % hashlib.sha256(body).hexdigest()[:32]
+        self.created = time.time()
+        self.last_modified = formatdate(self.created, usegmt=True)
+
+    def expired(self) -> bool:
+        return time.time() - self.created > CACHE_TTL_SECONDS
+
+
+class ResponseCache:
+    """Serialized responses keyed per (user, resource)."""
+
+    def __init__(self):
+        self._entries: Dict[Tuple[str, str], CacheEntry] = {}
+        self._lock = threading.Lock()
+
+    def get(self, owner: str, resource: str, generation: Optional[str]) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get((str(owner), resource))
+            if entry and (entry.expired() or entry.generation != generation):
+                del self._entries[(str(owner), resource)]
+                return None
+            return entry
+
+    def put(self, owner: str, resource: str, body: bytes, generation: Optional[str]) -> CacheEntry:
+        entry = CacheEntry(body, generation)
+        with self._lock:
+            self._entries[(str(owner), resource)] = entry
+        return entry
+
+    def invalidate(self, owner: str, resource: Optional[str] = None):
+        with self._lock:
+            if resource is not None:
+                self._entries.pop((str(owner), resource), None)
+            else:
+                for key in [key for key in self._entries if key[0] == str(owner)]:
+                    del self._entries[key]
+        # Other workers only see the new generation, which drops all of the owner's entries
+        DatabaseService.bump_cache_generation(str(owner))
+
+
+class UserCache:
+    """Users rows keyed by email so authenticated polls skip the users query."""
+
+    def __init__(self):
+        self._users: Dict[str, Tuple[float, Optional[str], Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, email: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cached = self._users.get(email)
+        if not cached:
+            return None
+        stored_at, generation, user = cached
+        # The generation check catches updates and deletions made through other workers
+        if time.time() - stored_at > CACHE_TTL_SECONDS or DatabaseService.get_cache_generation(str(user["id"])) != generation:
+            with self._lock:
+                self._users.pop(email, None)
+            return None
+        return user
+
+    def put(self, email: str, user: Dict[str, Any], generation: Optional[str]):
+        with self._lock:
+            self._users[email] = (time.time(), generation, user)
+
+    def invalidate_user(self, user_id: str):
+        with self._lock:
+            for email in [email for email, (_, _, user) in self._users.items() if str(user.get("id")) == str(user_id)]:
+                del self._users[email]
+        DatabaseService.bump_cache_generation(str(user_id))
+
+
+response_cache = ResponseCache()
+user_cache = UserCache()
+
+
+def _not_modified(request: Request, entry: CacheEntry) -> bool:
+    # Only the ETag is trusted: it is a hash of the body, so it is exact across writes
+    # within the same second and across workers. If-Modified-Since is ignored.
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is None:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or entry.etag in tags or "W/" + entry.etag in tags
+
+
+def cached_response(request: Request, owner: str, resource: str, model: Any, loader: Callable[[], Any]) -> Response:
+    """Serves `resource` for `owner` from the cache, answering 304 when the client copy is current.
+
+    `loader` is only called on a miss; it may raise HTTPException as the handler would.
+    `model` is the response model (or a List[...] of it) used to validate and serialize the result.
+    """
+    # Read before loading: a write racing with the load leaves the entry on the old generation
+    generation = DatabaseService.get_cache_generation(str(owner))
+    entry = response_cache.get(owner, resource, generation)
+    if entry is None:
+        data = loader()
+        if isinstance(data, list):
+            item_model = model.__args__[0]
+            validated = [item_model.model_validate(item) for item in data]
+        else:
+            validated = model.model_validate(data)
+        body = dumps(jsonable_encoder(validated))
+        entry = response_cache.put(owner, resource, body, generation)
+
+    headers = {
+        "ETag": entry.etag,
+        "Last-Modified": entry.last_modified,
+        "Cache-Control": "private, no-cache",
+    }
+    if _not_modified(request, entry):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
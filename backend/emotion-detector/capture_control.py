@@ -0,0 +1,113 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Any, Optional
+
+# Capture profiles offered to camera clients, from best quality to cheapest.
+# Clients start at level 0 and the server moves them down the ladder when
+# inference falls behind, and back up once it has recovered.
+CAPTURE_PROFILES = [
+    {"fps": 15, "width": 640, "height": 480, "jpeg_quality": 0.85},
+    {"fps": 10, "width": 640, "height": 480, "jpeg_quality": 0.75},
+    {"fps": 8, "width": 480, "height": 360, "jpeg_quality": 0.7},
+    {"fps": 5, "width": 320, "height": 240, "jpeg_quality": 0.65},
+    {"fps": 2, "width": 320, "height": 240, "jpeg_quality": 0.5},
+]
+
+# Threads running inference; frames beyond this wait in the executor's queue.
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "4"))
+# Per-connection processing latency (ms) considered healthy.
+TARGET_LATENCY_MS = float(os.getenv("CAPTURE_TARGET_LATENCY_MS", "150"))
+# Consecutive healthy frames required before stepping a client back up.
+RECOVERY_FRAMES = int(os.getenv("CAPTURE_RECOVERY_FRAMES", "30"))
+# Smoothing factor for the per-connection latency moving average.
+LATENCY_ALPHA = 0.2
+
+
+class InferenceLoad:
+    """Node-wide count of frames waiting for or running inference."""
+
+    def __init__(self):
+        self.pending = 0
+
+    def try_acquire(self, limit: int) -> bool:
+        if self.pending >= limit:
+            return False
+        self.pending += 1
+        return True
+
+    def release(self):
+        self.pending = max(0, self.pending - 1)
+
+    def pressure(self) -> float:
+        # 1.0 means every worker is busy; above that frames are queueing
+        return self.pending / max(1, INFERENCE_WORKERS)
+
+
+inference_load = InferenceLoad()
+# Dedicated pool, so frames queue here instead of oversubscribing the CPU through
+# the shared request threadpool, and pending - INFERENCE_WORKERS is a real backlog
+inference_executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
+
+
+async def run_inference(func: Callable, *args) -> Any:
+    return await asyncio.get_running_loop().run_in_executor(inference_executor, func, *args)
+
+
+class CaptureController:
+    """Chooses the capture profile for a single /ws/analyze connection."""
+
+    def __init__(self, load: InferenceLoad = inference_load):
+        self.load = load
+        self.level = 0
+        self.latency_ms: Optional[float] = None
+        self.healthy_frames = 0
+        self.sent_level: Optional[int] = None
+
+    def record_latency(self, elapsed_ms: float):
+        if self.latency_ms is None:
+            self.latency_ms = elapsed_ms
+        else:
+            self.latency_ms = LATENCY_ALPHA * elapsed_ms + (1 - LATENCY_ALPHA) * self.latency_ms
+
+    def _target_level(self) -> int:
+        last = len(CAPTURE_PROFILES) - 1
+        pressure = self.load.pressure()
+        # Queue depth: one level per half worker-pool of backlog
+        queue_level = 0 if pressure <= 1.0 else int((pressure - 1.0) * 2) + 1
+        # Latency: one level per multiple of the target latency exceeded
+        latency_level = 0
+        if self.latency_ms is not None and self.latency_ms > TARGET_LATENCY_MS:
+            latency_level = int(self.latency_ms / TARGET_LATENCY_MS)
+        return min(last, max(queue_level, latency_level))
+
+    def update(self) -> int:
+        target = self._target_level()
+        if target > self.level:
+            # Degrade immediately so the backlog stops growing
+            self.level = target
+            self.healthy_frames = 0
+        elif target < self.level:
+            # Recover one step at a time to avoid oscillating
+            self.healthy_frames += 1
+            if self.healthy_frames >= RECOVERY_FRAMES:
+                self.level -= 1
+                self.healthy_frames = 0
+        else:
+            self.healthy_frames = 0
+        return self.level
+
+    def settings(self) -> Dict[str, Any]:
+        return {"type": "capture_settings", "level": self.level, **CAPTURE_PROFILES[self.level]}
+
+    def pending_message(self) -> Optional[Dict[str, Any]]:
+        """Returns a control message if the client has not seen the current level yet."""
+        if self.sent_level == self.level:
+            return None
+        self.sent_level = self.level
+        return self.settings()
+
+
+def now_ms() -> float:
+    return time.perf_counter() * 1000
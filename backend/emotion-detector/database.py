@@ -1,6 +1,7 @@
 from supabase import create_client, Client
 import os
-from typing import List, Dict, Any
+import uuid
+from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -22,6 +23,19 @@ class DatabaseService:
         response = supabase.table('users').select('*').eq('email', email).execute()
         return response.data[0] if response.data else None
 
+    @staticmethod
+    def get_user_with_profile(email: str) -> Dict[str, Any]:
+        # One round trip: the user row plus its child or psychologist profile
+        response = supabase.table('users').select('*, children(*), psychologists(*)').eq('email', email).execute()
+        if not response.data:
+            return None
+        user = response.data[0]
+        children = user.pop('children', None) or []
+        psychologists = user.pop('psychologists', None) or []
+        user['child'] = children[0] if children else None
+        user['psychologist'] = psychologists[0] if psychologists else None
+        return user
+
     @staticmethod
     def get_user_by_id(user_id: str) -> Dict[str, Any]:
         response = supabase.table('users').select('*').eq('id', user_id).execute()
@@ -67,6 +81,16 @@ class DatabaseService:
         response = supabase.table('children').select('*').eq('user_id', user_id).execute()
         return response.data[0] if response.data else None
 
+    @staticmethod
+    def get_child_by_id(child_id: str) -> Dict[str, Any]:
+        response = supabase.table('children').select('*').eq('id', child_id).execute()
+        return response.data[0] if response.data else None
+
+    @staticmethod
+    def get_child_ids() -> List[str]:
+        response = supabase.table('children').select('id').execute()
+        return [row['id'] for row in response.data]
+
     @staticmethod
     def create_child(child_data: Dict[str, Any]) -> Dict[str, Any]:
         response = supabase.table('children').insert(child_data).execute()
@@ -97,6 +121,26 @@ class DatabaseService:
         response = supabase.table('biometric_data').select('*').eq('child_id', child_id).order('timestamp', desc=True).limit(limit).execute()
         return response.data
 
+    @staticmethod
+    def get_biometric_data_before(child_id: str, cutoff: str, limit: int) -> List[Dict[str, Any]]:
+        response = supabase.table('biometric_data').select('*').eq('child_id', child_id).lt('timestamp', cutoff).order('timestamp').order('id').limit(limit).execute()
+        return response.data
+
+    @staticmethod
+    def delete_biometric_data(ids: List[str]) -> int:
+        response = supabase.table('biometric_data').delete().in_('id', ids).execute()
+        return len(response.data)
+
+    @staticmethod
+    def get_existing_ids(table: str, ids: List[str]) -> List[str]:
+        response = supabase.table(table).select('id').in_('id', ids).execute()
+        return [str(row['id']) for row in response.data]
+
+    @staticmethod
+    def get_biometric_data_since(child_id: str, since: str, offset: int, limit: int) -> List[Dict[str, Any]]:
+        response = supabase.table('biometric_data').select('*').eq('child_id', child_id).gte('timestamp', since).order('timestamp').range(offset, offset + limit - 1).execute()
+        return response.data
+
     @staticmethod
     def save_alert(alert_data: Dict[str, Any]) -> Dict[str, Any]:
         response = supabase.table('biometric_alerts').insert(alert_data).execute()
@@ -122,6 +166,26 @@ class DatabaseService:
         response = supabase.table('emotion_records').select('*').eq('child_id', child_id).order('timestamp', desc=True).limit(limit).execute()
         return response.data
 
+    @staticmethod
+    def get_emotion_records_before(child_id: str, cutoff: str, limit: int) -> List[Dict[str, Any]]:
+        response = supabase.table('emotion_records').select('*').eq('child_id', child_id).lt('timestamp', cutoff).order('timestamp').order('id').limit(limit).execute()
+        return response.data
+
+    @staticmethod
+    def delete_emotion_records(ids: List[str]) -> int:
+        response = supabase.table('emotion_records').delete().in_('id', ids).execute()
+        return len(response.data)
+
+    @staticmethod
+    def get_emotion_records_since(child_id: str, since: str, offset: int, limit: int) -> List[Dict[str, Any]]:
+        response = supabase.table('emotion_records').select('*').eq('child_id', child_id).gte('timestamp', since).order('timestamp').range(offset, offset + limit - 1).execute()
+        return response.data
+
+    @staticmethod
+    def count_samples_between(table: str, child_id: str, start: str, end: str) -> int:
+        response = supabase.table(table).select('id', count='exact').eq('child_id', child_id).gte('timestamp', start).lte('timestamp', end).limit(1).execute()
+        return response.count or 0
+
     @staticmethod
     def create_therapy_session(session_data: Dict[str, Any]) -> Dict[str, Any]:
         response = supabase.table('therapy_sessions').insert(session_data).execute()
@@ -137,6 +201,16 @@ class DatabaseService:
         response = supabase.table('therapy_sessions').select('*').eq('child_id', child_id).order('start_time', desc=True).execute()
         return response.data
 
+    @staticmethod
+    def get_therapy_session(session_id: str) -> Dict[str, Any]:
+        response = supabase.table('therapy_sessions').select('*').eq('id', session_id).execute()
+        return response.data[0] if response.data else None
+
+    @staticmethod
+    def get_active_therapy_session(child_id: str) -> Dict[str, Any]:
+        response = supabase.table('therapy_sessions').select('*').eq('child_id', child_id).eq('status', 'active').order('start_time', desc=True).limit(1).execute()
+        return response.data[0] if response.data else None
+
     @staticmethod
     def create_emotional_island(island_data: Dict[str, Any]) -> Dict[str, Any]:
         response = supabase.table('emotional_islands').insert(island_data).execute()
@@ -151,3 +225,53 @@ class DatabaseService:
     def get_emotional_islands(child_id: str) -> List[Dict[str, Any]]:
         response = supabase.table('emotional_islands').select('*').eq('child_id', child_id).execute()
         return response.data
+
+    @staticmethod
+    def get_row_owners(table: str, ids: List[str]) -> Dict[str, str]:
+        response = supabase.table(table).select('id, child_id').in_('id', ids).execute()
+        return {str(row['id']): str(row['child_id']) for row in response.data}
+
+    @staticmethod
+    def upsert_emotional_islands(islands: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        response = supabase.table('emotional_islands').upsert(islands).execute()
+        return response.data
+
+    @staticmethod
+    def save_emotion_records(records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Rows already stored (a retried batch) are skipped and not returned
+        response = supabase.table('emotion_records').upsert(records, ignore_duplicates=True).execute()
+        return response.data
+
+    @staticmethod
+    def save_alerts(alerts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        response = supabase.table('biometric_alerts').upsert(alerts, ignore_duplicates=True).execute()
+        return response.data
+
+    @staticmethod
+    def resolve_child_alerts(child_id: str, alert_ids: List[str]) -> List[str]:
+        response = supabase.table('biometric_alerts').update({'resolved': True}).eq('child_id', child_id).in_('id', alert_ids).execute()
+        return [str(row['id']) for row in response.data]
+
+    @staticmethod
+    def get_rows_updated_at(table: str, child_id: str, updated_at: str, after_id: str, limit: int) -> List[Dict[str, Any]]:
+        response = supabase.table(table).select('*').eq('child_id', child_id).eq('updated_at', updated_at).gt('id', after_id).order('id').limit(limit).execute()
+        return response.data
+
+    @staticmethod
+    def get_rows_updated_after(table: str, child_id: str, since: Optional[str], limit: int) -> List[Dict[str, Any]]:
+        query = supabase.table(table).select('*').eq('child_id', child_id)
+        if since is not None:
+            query = query.gt('updated_at', since)
+        response = query.order('updated_at').order('id').limit(limit).execute()
+        return response.data
+
+    @staticmethod
+    def get_cache_generation(owner_id: str) -> Optional[str]:
+        response = supabase.table('cache_generations').select('generation').eq('id', owner_id).execute()
+        return response.data[0]['generation'] if response.data else None
+
+    @staticmethod
+    def bump_cache_generation(owner_id: str) -> str:
+        generation = str(uuid.uuid4())
+        supabase.table('cache_generations').upsert({'id': owner_id, 'generation': generation}).execute()
+        return generation
@@ -0,0 +1,49 @@
+import io
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+from PIL import Image
+
+# Mean absolute difference (0-255 grey levels) between downsampled frames
+# below which a frame is treated as unchanged.
+FRAME_CHANGE_THRESHOLD = float(os.getenv("FRAME_CHANGE_THRESHOLD", "4.0"))
+# Cached detections are never reused for longer than this.
+FRAME_MAX_REUSE_SECONDS = float(os.getenv("FRAME_MAX_REUSE_SECONDS", "2.0"))
+# Size of the grayscale thumbnail frames are compared on.
+FRAME_SIGNATURE_SIZE = (32, 24)
+
+
+def frame_signature(data: bytes) -> np.ndarray:
+    """Cheap grayscale thumbnail of an encoded frame, used for change detection."""
+    img = Image.open(io.BytesIO(data))
+    # For JPEG this decodes at reduced scale, which is much cheaper than a full decode
+    img.draft("L", (FRAME_SIGNATURE_SIZE[0] * 2, FRAME_SIGNATURE_SIZE[1] * 2))
+    thumbnail = img.convert("L").resize(FRAME_SIGNATURE_SIZE, Image.BILINEAR)
+    return np.asarray(thumbnail, dtype=np.int16)
+
+
+class FrameReuseCache:
+    """Per-connection record of the last frame that went through full inference."""
+
+    def __init__(self):
+        self.signature: Optional[np.ndarray] = None
+        self.results: Optional[List[Dict[str, Any]]] = None
+        self.computed_at = 0.0
+
+    def lookup(self, signature: np.ndarray) -> Optional[List[Dict[str, Any]]]:
+        if self.signature is None or self.signature.shape != signature.shape:
+            return None
+        if time.monotonic() - self.computed_at > FRAME_MAX_REUSE_SECONDS:
+            return None
+        # Compare against the frame inference actually ran on, not the previous
+        # frame, so slow drift still triggers a fresh detection
+        if np.abs(signature - self.signature).mean() >= FRAME_CHANGE_THRESHOLD:
+            return None
+        return self.results
+
+    def store(self, signature: np.ndarray, results: List[Dict[str, Any]]):
+        self.signature = signature
+        self.results = results
+        self.computed_at = time.monotonic()
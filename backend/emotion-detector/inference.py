@@ -0,0 +1,114 @@
+import hashlib
+import os
+from typing import Any, List
+
+import torch
+
+# Thread policy for CPU inference; 0 keeps PyTorch's default.
+INFERENCE_INTRA_OP_THREADS = int(os.getenv("INFERENCE_INTRA_OP_THREADS", "0"))
+INFERENCE_INTER_OP_THREADS = int(os.getenv("INFERENCE_INTER_OP_THREADS", "0"))
+# How to optimize the models: 'none', 'torchscript' (traced and cached on disk) or 'compile' (torch.compile).
+INFERENCE_COMPILE = os.getenv("INFERENCE_COMPILE", "none").lower()
+# Where traced models (and torch.compile's inductor cache) are stored between starts.
+INFERENCE_CACHE_DIR = os.getenv("INFERENCE_CACHE_DIR", "model_cache")
+# Tolerance when checking optimized models against eager mode.
+VERIFY_RTOL = 1e-4
+VERIFY_ATOL = 1e-5
+
+
+def configure_threads():
+    """Applies the configured thread counts. Must run before any model executes."""
+    if INFERENCE_INTRA_OP_THREADS > 0:
+        torch.set_num_threads(INFERENCE_INTRA_OP_THREADS)
+    if INFERENCE_INTER_OP_THREADS > 0:
+        try:
+            torch.set_num_interop_threads(INFERENCE_INTER_OP_THREADS)
+        except RuntimeError as e:
+            # Only allowed once, before inter-op parallel work has started
+            print(f"Could not set inter-op threads: {e}")
+    print(f"Torch threads: intra-op={torch.get_num_threads()}, inter-op={torch.get_num_interop_threads()}")
+
+
+def _weights_digest(module: torch.nn.Module) -> str:
+    digest = hashlib.sha1()
+    for name, tensor in module.state_dict().items():
+        digest.update(name.encode("utf-8"))
+        digest.update(tensor.detach().cpu().numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+def _outputs_match(expected: Any, actual: Any) -> bool:
+    if isinstance(expected, torch.Tensor):
+        return (isinstance(actual, torch.Tensor) and expected.shape == actual.shape
+                and torch.allclose(expected, actual, rtol=VERIFY_RTOL, atol=VERIFY_ATOL))
+    if isinstance(expected, (tuple, list)):
+        return (isinstance(actual, (tuple, list)) and len(expected) == len(actual)
+                and all(_outputs_match(e, a) for e, a in zip(expected, actual)))
+    return expected == actual
+
+
+def _verify(module: torch.nn.Module, optimized: torch.nn.Module, examples: List[torch.Tensor]) -> bool:
+    """Predictions must not change: the optimized model has to reproduce eager outputs."""
+    with torch.inference_mode():
+        return all(_outputs_match(module(example), optimized(example)) for example in examples)
+
+
+def _traced(module: torch.nn.Module, examples: List[torch.Tensor], name: str, device: str) -> torch.nn.Module:
+    # The cache key covers the weights, torch version and device, so a model or
+    # library upgrade never loads a stale artifact
+    key = f"{name}-{_weights_digest(module)}-torch{torch.__version__}-{device}".replace("/", "_").replace("+", "_")
+    path = os.path.join(INFERENCE_CACHE_DIR, key + ".pt")
+    if os.path.exists(path):
+        traced = torch.jit.load(path, map_location=device)
+        if _verify(module, traced, examples):
+            return traced
+        os.remove(path)
+
+    with torch.inference_mode():
+        traced = torch.jit.freeze(torch.jit.trace(module.eval(), examples[0]))
+    # Shape-dependent code can be baked in by tracing; never cache such an artifact
+    if not _verify(module, traced, examples):
+        raise RuntimeError("traced outputs differ from eager mode")
+    os.makedirs(INFERENCE_CACHE_DIR, exist_ok=True)
+    tmp_path = path + ".tmp"
+    torch.jit.save(traced, tmp_path)
+    os.replace(tmp_path, path)
+    return traced
+
+
+def _optimize(module: torch.nn.Module, shapes: List[tuple], name: str, device: str) -> torch.nn.Module:
+    # Random inputs, one per shape; the first is also the tracing example
+    generator = torch.Generator().manual_seed(0)
+    examples = [torch.rand(shape, generator=generator).to(device) for shape in shapes]
+    module.eval()
+    try:
+        if INFERENCE_COMPILE == "torchscript":
+            return _traced(module, examples, name, device)
+        if INFERENCE_COMPILE == "compile":
+            compiled = torch.compile(module, dynamic=True)
+            if not _verify(module, compiled, examples):
+                raise RuntimeError("compiled outputs differ from eager mode")
+            return compiled
+    except Exception as e:
+        print(f"Could not optimize {name}, using eager mode: {e}")
+    return module
+
+
+def optimize_models(mtcnn: Any, fer: Any, model_name: str, device: str):
+    """Swaps the MTCNN stages and the emotion classifier for traced or compiled versions."""
+    if INFERENCE_COMPILE not in ("torchscript", "compile"):
+        return
+    if INFERENCE_COMPILE == "compile":
+        # Lets torch.compile reuse its generated kernels across restarts
+        os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.join(INFERENCE_CACHE_DIR, "inductor"))
+
+    # P-Net is fully convolutional and runs on every pyramid scale;
+    # R-Net and O-Net take fixed-size crops in variable-size batches.
+    # The second shape checks the optimized model generalizes beyond the first.
+    mtcnn.pnet = _optimize(mtcnn.pnet, [(1, 3, 120, 160), (1, 3, 67, 89)], "mtcnn-pnet", device)
+    mtcnn.rnet = _optimize(mtcnn.rnet, [(2, 3, 24, 24), (5, 3, 24, 24)], "mtcnn-rnet", device)
+    mtcnn.onet = _optimize(mtcnn.onet, [(2, 3, 48, 48), (5, 3, 48, 48)], "mtcnn-onet", device)
+
+    img_size = getattr(fer, "img_size", 224)
+    fer.model = _optimize(fer.model, [(1, 3, img_size, img_size), (2, 3, img_size, img_size)], model_name, device)
+    print(f"Inference models optimized with {INFERENCE_COMPILE}")
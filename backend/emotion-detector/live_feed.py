@@ -0,0 +1,100 @@
+import asyncio
+import os
+import time
+from typing import Any, Dict, Optional, Set
+
+# Fastest rate a subscriber can ask for; the feed is downsampled per subscriber.
+LIVE_FEED_MIN_INTERVAL_SECONDS = float(os.getenv("LIVE_FEED_MIN_INTERVAL_SECONDS", "0.5"))
+# Events buffered per subscriber before the oldest ones are dropped (slow consumers).
+LIVE_FEED_QUEUE_SIZE = int(os.getenv("LIVE_FEED_QUEUE_SIZE", "16"))
+
+
+class Subscription:
+    def __init__(self, child_id: str, interval: float):
+        self.child_id = child_id
+        self.interval = max(interval, LIVE_FEED_MIN_INTERVAL_SECONDS)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=LIVE_FEED_QUEUE_SIZE)
+        self.last_delivered = 0.0
+
+    def offer(self, event: Dict[str, Any], downsample: bool = True):
+        now = time.monotonic()
+        if downsample:
+            if now - self.last_delivered < self.interval:
+                return
+            self.last_delivered = now
+        if self.queue.full():
+            # Never block the analysis pipeline on a slow viewer
+            self.queue.get_nowait()
+        self.queue.put_nowait(event)
+
+
+class LiveFeedHub:
+    """In-process publish/subscribe of per-child detections.
+
+    Publishing and subscribing both happen on the event loop, so no locking is needed.
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[str, Set[Subscription]] = {}
+        self._last_event: Dict[str, Dict[str, Any]] = {}
+        # Open camera streams per child; a child may stream from several devices
+        self._publishers: Dict[str, int] = {}
+
+    def subscribe(self, child_id: str, interval: float = LIVE_FEED_MIN_INTERVAL_SECONDS) -> Subscription:
+        subscription = Subscription(str(child_id), interval)
+        self._subscribers.setdefault(subscription.child_id, set()).add(subscription)
+        # Start the viewer from the latest known state instead of a blank screen
+        last_event = self._last_event.get(subscription.child_id)
+        if last_event is not None:
+            subscription.offer(last_event)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        subscribers = self._subscribers.get(subscription.child_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self._subscribers[subscription.child_id]
+
+    def publish(self, child_id: str, event: Dict[str, Any]):
+        child_id = str(child_id)
+        self._last_event[child_id] = event
+        for subscription in list(self._subscribers.get(child_id, ())):
+            subscription.offer(event)
+
+    def start_stream(self, child_id: str):
+        child_id = str(child_id)
+        self._publishers[child_id] = self._publishers.get(child_id, 0) + 1
+
+    def end_stream(self, child_id: str):
+        child_id = str(child_id)
+        remaining = self._publishers.get(child_id, 0) - 1
+        if remaining > 0:
+            self._publishers[child_id] = remaining
+            return
+        self._publishers.pop(child_id, None)
+        self._last_event.pop(child_id, None)
+        # Lifecycle events are always delivered, regardless of downsampling
+        for subscription in list(self._subscribers.get(child_id, ())):
+            subscription.offer({"type": "stream_ended", "child_id": child_id}, downsample=False)
+
+
+live_feed_hub = LiveFeedHub()
+
+
+def detections_event(child_id: str, detections: Any, reused: bool, timestamp: Optional[str] = None) -> Dict[str, Any]:
+    return {
+        "type": "detections",
+        "child_id": str(child_id),
+        "timestamp": timestamp,
+        "reused": reused,
+        "detections": [
+            {
+                "emotion": detection["emotion"],
+                "intensity": round(max(detection["scores"]) * 100, 1),
+                "box": detection["box"],
+            }
+            for detection in detections
+        ],
+    }
@@ -0,0 +1,598 @@
+"""
+End-to-end load generator for the MindBridge API.
+
+Drives mixed traffic (registration and login, history polling, biometric
+posts and concurrent /ws/analyze camera streams) against the FastAPI app and
+reports throughput, latency percentiles and error rates per endpoint.
+
+By default the app is started in-process with an in-memory stand-in for
+Supabase and stub face/emotion models, so it runs offline. Use --url to
+target a real deployment instead.
+
+Extra dependencies: pip install httpx websockets
+
+Examples:
+    python loadtest.py --children 20 --psychologists 5 --duration 30
+    python loadtest.py --ramp 5,10,20,40,80 --stage-duration 20 --detect-ms 40
+    python loadtest.py --frames ./recorded_frames --url http://127.0.0.1:8000
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+import types
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+
+# ---------------------------------------------------------------------------
+# In-memory Supabase stand-in
+# ---------------------------------------------------------------------------
+
+TABLE_DEFAULTS = {
+    "users": {"avatar": None},
+    "psychologists": {"specializations": [], "assigned_children": [], "hospital": None, "years_experience": 0},
+    "children": {"diagnosis": [], "assigned_psychologist": None, "preferences": {}, "current_emotion": "neutral"},
+    "biometric_data": {},
+    "biometric_alerts": {"resolved": False, "action_taken": None},
+    "emotion_records": {"triggers": [], "context": None},
+    "therapy_sessions": {"end_time": None, "status": "active", "objectives": [], "notes": None, "summary": None, "summary_checkpoint": None},
+    "emotional_islands": {"unlocked": False, "visit_count": 0, "last_visit": None, "progress": {}},
+    "cache_generations": {},
+}
+# Columns defaulting to NOW() in schema.sql
+TIMESTAMP_DEFAULTS = {
+    "users": ["created_at", "updated_at"],
+    "biometric_data": ["timestamp", "created_at"],
+    "biometric_alerts": ["timestamp", "created_at", "updated_at"],
+    "emotion_records": ["timestamp", "created_at", "updated_at"],
+    "therapy_sessions": ["start_time", "created_at", "updated_at"],
+    "emotional_islands": ["created_at", "updated_at"],
+    "cache_generations": ["updated_at"],
+}
+# Foreign keys usable in embedded selects: (parent, embedded) -> (parent column, embedded column, many)
+RELATIONS = {
+    ("users", "children"): ("id", "user_id", True),
+    ("users", "psychologists"): ("id", "user_id", True),
+    ("children", "users"): ("user_id", "id", False),
+}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _jsonable(value: Any) -> Any:
+    # The real client sends JSON, so stored values never keep Python types
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, dict):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_jsonable(v) for v in value]
+    return value
+
+
+def _comparable(value: Any) -> Any:
+    if isinstance(value, str) and len(value) >= 19 and value[4] == "-" and value[10] in "T ":
+        try:
+            ts = datetime.fromisoformat(value.replace("Z", "+00:00"))
+            return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+        except ValueError:
+            pass
+    return value
+
+
+class _Response:
+    def __init__(self, data: List[Dict[str, Any]], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+class _Query:
+    def __init__(self, db: "InMemorySupabase", table: str):
+        self.db = db
+        self.table = table
+        self.action = "select"
+        self.columns = "*"
+        self.count: Optional[str] = None
+        self.payload: Any = None
+        self.ignore_duplicates = False
+        self.filters: List[Tuple[str, str, Any]] = []
+        self.ordering: List[Tuple[str, bool]] = []
+        self.row_limit: Optional[int] = None
+        self.row_range: Optional[Tuple[int, int]] = None
+
+    def select(self, columns: str = "*", count: Optional[str] = None):
+        self.columns, self.count = columns, count
+        return self
+
+    def insert(self, data: Any):
+        self.action, self.payload = "insert", data
+        return self
+
+    def upsert(self, data: Any, ignore_duplicates: bool = False):
+        self.action, self.payload, self.ignore_duplicates = "upsert", data, ignore_duplicates
+        return self
+
+    def update(self, data: Dict[str, Any]):
+        self.action, self.payload = "update", data
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    def _filter(self, op: str, column: str, value: Any):
+        self.filters.append((op, column, _jsonable(value)))
+        return self
+
+    def eq(self, column, value):
+        return self._filter("eq", column, value)
+
+    def neq(self, column, value):
+        return self._filter("neq", column, value)
+
+    def lt(self, column, value):
+        return self._filter("lt", column, value)
+
+    def lte(self, column, value):
+        return self._filter("lte", column, value)
+
+    def gt(self, column, value):
+        return self._filter("gt", column, value)
+
+    def gte(self, column, value):
+        return self._filter("gte", column, value)
+
+    def in_(self, column, values):
+        return self._filter("in", column, list(values))
+
+    def order(self, column: str, desc: bool = False):
+        self.ordering.append((column, desc))
+        return self
+
+    def limit(self, count: int):
+        self.row_limit = count
+        return self
+
+    def range(self, start: int, end: int):
+        self.row_range = (start, end)
+        return self
+
+    def _matches(self, row: Dict[str, Any]) -> bool:
+        for op, column, value in self.filters:
+            actual = row.get(column)
+            if op == "eq" and str(actual) != str(value):
+                return False
+            if op == "neq" and str(actual) == str(value):
+                return False
+            if op == "in" and str(actual) not in {str(v) for v in value}:
+                return False
+            if op in ("lt", "lte", "gt", "gte"):
+                if actual is None:
+                    return False
+                a, b = _comparable(actual), _comparable(value)
+                if (op == "lt" and not a < b) or (op == "lte" and not a <= b) or \
+                        (op == "gt" and not a > b) or (op == "gte" and not a >= b):
+                    return False
+        return True
+
+    def _project(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        parts = [part.strip() for part in re.split(r",(?![^(]*\))", self.columns) if part.strip()]
+        result: Dict[str, Any] = {}
+        for part in parts:
+            embed = re.match(r"^(?:(\w+):)?(\w+)\((.*)\)$", part)
+            if part == "*":
+                result.update(row)
+            elif embed:
+                alias, table = embed.group(1) or embed.group(2), embed.group(2)
+                parent_col, child_col, many = RELATIONS[(self.table, table)]
+                related = [dict(r) for r in self.db.tables[table] if str(r.get(child_col)) == str(row.get(parent_col))]
+                result[alias] = related if many else (related[0] if related else None)
+            else:
+                result[part] = row.get(part)
+        return result
+
+    def _touch(self, row: Dict[str, Any], changes: Dict[str, Any]):
+        row.update(changes)
+        # Mirrors the update_updated_at_column() triggers
+        if "updated_at" in TIMESTAMP_DEFAULTS.get(self.table, ()):
+            row["updated_at"] = _now()
+
+    def execute(self) -> _Response:
+        with self.db.lock:
+            rows = self.db.tables[self.table]
+            if self.action in ("insert", "upsert"):
+                written = []
+                for item in (self.payload if isinstance(self.payload, list) else [self.payload]):
+                    item = _jsonable(item)
+                    existing = next((row for row in rows if "id" in item and str(row["id"]) == str(item["id"])), None)
+                    if existing is not None and self.action == "upsert":
+                        if not self.ignore_duplicates:
+                            self._touch(existing, item)
+                            written.append(dict(existing))
+                        continue
+                    row = {"id": str(uuid.uuid4()), **TABLE_DEFAULTS[self.table]}
+                    for column in TIMESTAMP_DEFAULTS.get(self.table, ["created_at"]):
+                        row[column] = _now()
+                    row.update({k: v for k, v in item.items() if v is not None or k not in row})
+                    rows.append(row)
+                    written.append(dict(row))
+                return _Response(written)
+            matched = [row for row in rows if self._matches(row)]
+            if self.action == "update":
+                for row in matched:
+                    self._touch(row, _jsonable(self.payload))
+                return _Response([dict(row) for row in matched])
+            if self.action == "delete":
+                ids = {id(row) for row in matched}
+                rows[:] = [row for row in rows if id(row) not in ids]
+                return _Response(matched)
+
+            for column, desc in reversed(self.ordering):
+                matched.sort(key=lambda r: (r.get(column) is None, _comparable(r.get(column)) if r.get(column) is not None else 0), reverse=desc)
+            total = len(matched) if self.count else None
+            if self.row_range is not None:
+                matched = matched[self.row_range[0]:self.row_range[1] + 1]
+            if self.row_limit is not None:
+                matched = matched[:self.row_limit]
+            return _Response([self._project(row) for row in matched], total)
+
+
+class InMemorySupabase:
+    """Just enough of the supabase-py query builder for DatabaseService."""
+
+    def __init__(self):
+        self.tables: Dict[str, List[Dict[str, Any]]] = {name: [] for name in TABLE_DEFAULTS}
+        self.lock = threading.Lock()
+
+    def table(self, name: str) -> _Query:
+        return _Query(self, name)
+
+
+# ---------------------------------------------------------------------------
+# Stub models
+# ---------------------------------------------------------------------------
+
+STUB_EMOTIONS = ["joy", "sadness", "anger", "fear", "disgust", "neutral"]
+
+
+def install_stub_models(detect_ms: float, classify_ms: float):
+    """Registers fake facenet_pytorch / hsemotion modules with a configurable per-call cost."""
+
+    class MTCNN:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def detect(self, img):
+            time.sleep(detect_ms / 1000)
+            w, h = img.size
+            return np.array([[w * 0.3, h * 0.2, w * 0.7, h * 0.8]]), np.array([0.99])
+
+    class HSEmotionRecognizer:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def predict_emotions(self, face_img, logits=True):
+            time.sleep(classify_ms / 1000)
+            scores = np.random.dirichlet(np.ones(len(STUB_EMOTIONS)))
+            return STUB_EMOTIONS[int(np.argmax(scores))], scores
+
+    facenet = types.ModuleType("facenet_pytorch")
+    facenet.MTCNN = MTCNN
+    hsemotion = types.ModuleType("hsemotion")
+    facial_emotions = types.ModuleType("hsemotion.facial_emotions")
+    facial_emotions.HSEmotionRecognizer = HSEmotionRecognizer
+    hsemotion.facial_emotions = facial_emotions
+    sys.modules.update({"facenet_pytorch": facenet, "hsemotion": hsemotion, "hsemotion.facial_emotions": facial_emotions})
+
+
+def start_local_server(port: int, detect_ms: float, classify_ms: float, keep_rate_limits: bool, frame_reuse: bool = False) -> Any:
+    if not frame_reuse:
+        # Every frame runs inference, so the saturation point measures inference
+        # capacity rather than the near-duplicate frame cache
+        os.environ.setdefault("FRAME_CHANGE_THRESHOLD", "0")
+    if not keep_rate_limits:
+        # The harness itself is one client address with many users
+        for name in ("FRAMES", "AUTH", "READ", "WRITE"):
+            os.environ.setdefault(f"RATE_LIMIT_{name}_PER_SECOND", "1000000")
+            os.environ.setdefault(f"RATE_LIMIT_{name}_BURST", "1000000")
+    os.environ.setdefault("ARCHIVE_DIR", tempfile.mkdtemp(prefix="mindbridge-loadtest-"))
+    install_stub_models(detect_ms, classify_ms)
+
+    import database
+    database.supabase = InMemorySupabase()
+    import main
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+# ---------------------------------------------------------------------------
+# Metrics
+# ---------------------------------------------------------------------------
+
+class Metrics:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.throttled: Dict[str, int] = {}
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+
+    def record(self, name: str, elapsed_ms: float, ok: bool = True, throttled: bool = False):
+        self.latencies.setdefault(name, []).append(elapsed_ms)
+        if throttled:
+            self.throttled[name] = self.throttled.get(name, 0) + 1
+        elif not ok:
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        report = {}
+        for name, values in sorted(self.latencies.items()):
+            arr = np.array(values)
+            report[name] = {
+                "count": len(values),
+                "rps": len(values) / elapsed,
+                "p50_ms": float(np.percentile(arr, 50)),
+                "p90_ms": float(np.percentile(arr, 90)),
+                "p99_ms": float(np.percentile(arr, 99)),
+                "error_rate": self.errors.get(name, 0) / len(values),
+                "throttled_rate": self.throttled.get(name, 0) / len(values),
+            }
+        return report
+
+
+def print_report(title: str, report: Dict[str, Dict[str, float]]):
+    print(f"\n{title}")
+    print(f"{'endpoint':<40}{'count':>8}{'rps':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'err%':>7}{'429%':>7}")
+    for name, row in report.items():
+        print(f"{name:<40}{row['count']:>8}{row['rps']:>9.1f}{row['p50_ms']:>9.1f}{row['p90_ms']:>9.1f}"
+              f"{row['p99_ms']:>9.1f}{row['error_rate'] * 100:>7.1f}{row['throttled_rate'] * 100:>7.1f}")
+
+
+# ---------------------------------------------------------------------------
+# Traffic
+# ---------------------------------------------------------------------------
+
+def load_frames(directory: Optional[str], count: int = 30) -> List[bytes]:
+    if directory:
+        names = sorted(n for n in os.listdir(directory) if n.lower().endswith((".jpg", ".jpeg")))
+        frames = [open(os.path.join(directory, n), "rb").read() for n in names]
+        if frames:
+            return frames
+    # Synthetic clip: a face-sized blob drifting over a gradient background whose
+    # brightness steps every frame, so consecutive frames differ by more than
+    # FRAME_CHANGE_THRESHOLD and are not served from the reuse cache
+    frames = []
+    background = np.tile(np.linspace(40, 200, 640), (480, 1))
+    for i in range(count):
+        shifted = np.clip(background + 12 * (i % 4), 0, 255).astype(np.uint8)
+        img = Image.fromarray(np.stack([shifted] * 3, axis=-1))
+        x = 220 + int(20 * np.sin(i / 5))
+        ImageDraw.Draw(img).ellipse([x, 120, x + 200, 380], fill=(220, 180, 150))
+        buffer = io.BytesIO()
+        img.save(buffer, "JPEG", quality=80)
+        frames.append(buffer.getvalue())
+    return frames
+
+
+async def timed(metrics: Metrics, client, name: str, method: str, url: str, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, url, **kwargs)
+        status_code = response.status_code
+    except Exception:
+        metrics.record(name, (time.perf_counter() - started) * 1000, ok=False)
+        return None
+    metrics.record(name, (time.perf_counter() - started) * 1000,
+                   ok=status_code < 400, throttled=status_code == 429)
+    return response
+
+
+async def register_and_login(metrics: Metrics, client, role: str, index: int, run_id: str) -> Optional[str]:
+    email = f"load-{run_id}-{role}-{index}@example.com"
+    password = "load-test-password"
+    await timed(metrics, client, "POST /auth/register", "POST", "/auth/register",
+                json={"name": f"Load {role} {index}", "email": email, "password": password, "role": role})
+    response = await timed(metrics, client, "POST /auth/login", "POST", "/auth/login",
+                           data={"username": email, "password": password})
+    if response is None or response.status_code != 200:
+        return None
+    token = response.json()["access_token"]
+    if role == "child":
+        # Registration leaves placeholder profile fields; fill them like onboarding would
+        await timed(metrics, client, "PUT /children/me", "PUT", "/children/me",
+                    headers={"Authorization": f"Bearer {token}"},
+                    json={"age": 8, "parent_email": f"parent-{index}@example.com", "diagnosis": ["TEA"]})
+    return token
+
+
+async def poll_loop(metrics: Metrics, client, token: str, endpoints: List[str], interval: float, deadline: float):
+    headers = {"Authorization": f"Bearer {token}"}
+    etags: Dict[str, str] = {}
+    await asyncio.sleep(random.uniform(0, interval))
+    while time.perf_counter() < deadline:
+        for endpoint in endpoints:
+            request_headers = dict(headers)
+            if endpoint in etags:
+                request_headers["If-None-Match"] = etags[endpoint]
+            response = await timed(metrics, client, f"GET {endpoint}", "GET", endpoint, headers=request_headers)
+            if response is not None and "etag" in response.headers:
+                etags[endpoint] = response.headers["etag"]
+        await asyncio.sleep(interval)
+
+
+async def biometric_loop(metrics: Metrics, client, token: str, interval: float, deadline: float):
+    headers = {"Authorization": f"Bearer {token}"}
+    await asyncio.sleep(random.uniform(0, interval))
+    while time.perf_counter() < deadline:
+        await timed(metrics, client, "POST /biometric-data", "POST", "/biometric-data", headers=headers, json={
+            "child_id": str(uuid.uuid4()),  # overwritten server-side
+            "heart_rate": random.randint(70, 120),
+            "stress_level": random.choice(["low", "medium", "high"]),
+            "skin_temperature": round(random.uniform(36.0, 37.5), 2),
+            "activity": random.choice(["resting", "active", "excited", "agitated"]),
+        })
+        await asyncio.sleep(interval)
+
+
+async def camera_stream(metrics: Metrics, ws_url: str, token: str, frames: List[bytes], deadline: float):
+    import websockets
+
+    fps = 15.0
+    backoff_until = 0.0
+    try:
+        async with websockets.connect(f"{ws_url}/ws/analyze", subprotocols=["bearer", token], max_size=None) as ws:
+            i = 0
+            while time.perf_counter() < deadline:
+                now = time.perf_counter()
+                if now < backoff_until:
+                    await asyncio.sleep(backoff_until - now)
+                    continue
+                started = time.perf_counter()
+                await ws.send(frames[i % len(frames)])
+                i += 1
+                # Read control messages until this frame's answer arrives
+                while True:
+                    message = json.loads(await ws.recv())
+                    if message.get("type") == "capture_settings":
+                        fps = float(message["fps"])
+                        continue
+                    if message.get("type") == "backoff":
+                        metrics.record("WS /ws/analyze frame", (time.perf_counter() - started) * 1000, throttled=True)
+                        backoff_until = time.perf_counter() + message["retry_after_ms"] / 1000
+                        break
+                    name = "WS /ws/analyze frame (reused)" if message.get("reused") else "WS /ws/analyze frame"
+                    metrics.record(name, (time.perf_counter() - started) * 1000)
+                    break
+                await asyncio.sleep(max(0.0, 1 / fps - (time.perf_counter() - started)))
+    except Exception as e:
+        metrics.record("WS /ws/analyze connect", 0.0, ok=False)
+        print(f"Camera stream failed: {e}")
+
+
+async def run_stage(base_url: str, children: int, psychologists: int, duration: float,
+                    frames: List[bytes], poll_interval: float, biometric_interval: float) -> Metrics:
+    import httpx
+
+    metrics = Metrics()
+    run_id = uuid.uuid4().hex[:8]
+    ws_url = base_url.replace("http://", "ws://").replace("https://", "wss://")
+    limits = httpx.Limits(max_connections=children + psychologists + 10)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30, limits=limits) as client:
+        child_tokens = await asyncio.gather(*[register_and_login(metrics, client, "child", i, run_id) for i in range(children)])
+        psych_tokens = await asyncio.gather(*[register_and_login(metrics, client, "psychologist", i, run_id) for i in range(psychologists)])
+
+        # Rates are measured over the steady-traffic window only
+        metrics.started = time.perf_counter()
+        deadline = metrics.started + duration
+        tasks = []
+        for token in filter(None, child_tokens):
+            tasks.append(camera_stream(metrics, ws_url, token, frames, deadline))
+            tasks.append(poll_loop(metrics, client, token, ["/emotion-records/history", "/emotional-islands", "/therapy-sessions"], poll_interval, deadline))
+            tasks.append(biometric_loop(metrics, client, token, biometric_interval, deadline))
+        for token in filter(None, psych_tokens):
+            tasks.append(poll_loop(metrics, client, token, ["/psychologists/me", "/psychologists/children"], poll_interval, deadline))
+        await asyncio.gather(*tasks)
+        metrics.finished = time.perf_counter()
+    return metrics
+
+
+def find_saturation(stages: List[Tuple[int, Dict[str, Dict[str, float]]]], slo_ms: float) -> Optional[int]:
+    """First stage where inference throughput stops scaling with offered load or p99 breaks the SLO.
+
+    Only frames that ran inference count; reused frames measure the frame cache instead.
+    """
+    previous = None
+    for children, report in stages:
+        frames = report.get("WS /ws/analyze frame", {})
+        # Shed (backoff) frames are recorded too but are not served throughput
+        rps = frames.get("rps", 0) * (1 - frames.get("throttled_rate", 0))
+        p99 = frames.get("p99_ms", 0)
+        if p99 > slo_ms:
+            return children
+        if previous is not None:
+            prev_children, prev_rps = previous
+            expected_gain = (children - prev_children) / prev_children
+            actual_gain = (rps - prev_rps) / prev_rps if prev_rps else 0
+            if actual_gain < 0.5 * expected_gain:
+                return children
+        previous = (children, rps)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the MindBridge API")
+    parser.add_argument("--url", help="Target an already running server instead of the in-process stand-in")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--children", type=int, default=10)
+    parser.add_argument("--psychologists", type=int, default=3)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds of steady traffic")
+    parser.add_argument("--ramp", help="Comma-separated child counts to find the saturation point, e.g. 5,10,20,40")
+    parser.add_argument("--stage-duration", type=float, default=20)
+    parser.add_argument("--slo-ms", type=float, default=500, help="Frame p99 above this counts as saturated")
+    parser.add_argument("--frames", help="Directory of JPEG frames to replay (default: synthetic clip)")
+    parser.add_argument("--poll-interval", type=float, default=5)
+    parser.add_argument("--biometric-interval", type=float, default=2)
+    parser.add_argument("--detect-ms", type=float, default=30, help="Stub face detection cost per frame")
+    parser.add_argument("--classify-ms", type=float, default=15, help="Stub emotion classification cost per face")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="Do not lift the server's rate limits")
+    parser.add_argument("--frame-reuse", action="store_true",
+                        help="Keep the near-duplicate frame cache on (with --url, start the server with FRAME_CHANGE_THRESHOLD=0 to disable it)")
+    parser.add_argument("--json", help="Write the raw report to this file")
+    args = parser.parse_args()
+
+    base_url = args.url
+    if not base_url:
+        start_local_server(args.port, args.detect_ms, args.classify_ms, args.keep_rate_limits, args.frame_reuse)
+        base_url = f"http://127.0.0.1:{args.port}"
+    frames = load_frames(args.frames)
+
+    results: Dict[str, Any] = {}
+    if args.ramp:
+        stages = []
+        for children in [int(n) for n in args.ramp.split(",")]:
+            psychologists = max(1, children * args.psychologists // max(1, args.children))
+            metrics = asyncio.run(run_stage(base_url, children, psychologists, args.stage_duration, frames,
+                                            args.poll_interval, args.biometric_interval))
+            report = metrics.summary()
+            print_report(f"Stage: {children} children, {psychologists} psychologists", report)
+            stages.append((children, report))
+        saturation = find_saturation(stages, args.slo_ms)
+        print(f"\nSaturation point: {saturation} concurrent children" if saturation else
+              "\nNo saturation within the tested range")
+        results = {"stages": {str(c): r for c, r in stages}, "saturation_children": saturation}
+    else:
+        metrics = asyncio.run(run_stage(base_url, args.children, args.psychologists, args.duration, frames,
+                                        args.poll_interval, args.biometric_interval))
+        results = metrics.summary()
+        print_report(f"{args.children} children, {args.psychologists} psychologists, {args.duration:.0f}s", results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
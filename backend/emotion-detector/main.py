@@ -1,13 +1,16 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, status
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Depends, HTTPException, Request, status
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 import cv2
 import numpy as np
 from PIL import Image
 import io
 import torch
+import asyncio
 from datetime import datetime, timedelta
-from typing import List, Optional
+from typing import List, Optional, Dict, Any
 from uuid import UUID
 
 # Emotion Recognition
@@ -18,8 +21,18 @@ from facenet_pytorch import MTCNN
 
 # Local imports
 from models import *
-from auth_fixed import authenticate_user, create_access_token, get_current_user, get_password_hash
+from auth_fixed import authenticate_user, create_access_token, get_current_user, get_current_child, get_current_psychologist, get_websocket_user, get_password_hash, websocket_subprotocol
 from database import DatabaseService
+from cache import cached_response, response_cache, user_cache
+from archive import ARCHIVE_INTERVAL_SECONDS, compact_all, read_history
+from serialization import FastJSONResponse, parse_fields, project
+from session_stats import build_aggregate, session_registry
+from frame_cache import FrameReuseCache, frame_signature
+from inference import configure_threads, optimize_models
+from capture_control import CAPTURE_PROFILES, CaptureController, inference_load, now_ms, run_inference
+from live_feed import detections_event, live_feed_hub
+from rate_limit import INFERENCE_MAX_PENDING, limit_by_client, limit_by_user, rate_limiter
+from sync import SYNC_MAX_WRITES, SYNC_PAGE_SIZE, SYNC_TABLES, apply_writes, count_writes, pull_changes, settle_horizon
 
 app = FastAPI(
     title="MindBridge API",
@@ -39,6 +52,7 @@ app.add_middleware(
 # Initialize emotion detection models
 print("Initializing emotion detection models...")
 device = 'cuda' if torch.cuda.is_available() else 'cpu'
+configure_threads()
 
 # Face detector
 mtcnn = MTCNN(keep_all=True, device=device)
@@ -47,10 +61,27 @@ mtcnn = MTCNN(keep_all=True, device=device)
 model_name = 'enet_b0_8_best_afew'
 fer = HSEmotionRecognizer(model_name=model_name, device=device)
 
+# Optionally trace/compile the models (INFERENCE_COMPILE)
+optimize_models(mtcnn, fer, model_name, device)
+
 print("Models initialized!")
 
+# Background compaction of old emotion/biometric rows into the archive tiers
+async def archive_compaction_loop():
+    while True:
+        await asyncio.sleep(ARCHIVE_INTERVAL_SECONDS)
+        try:
+            compacted = await run_in_threadpool(compact_all)
+            print(f"Archive compaction finished: {compacted}")
+        except Exception as e:
+            print(f"Archive compaction failed: {e}")
+
+@app.on_event("startup")
+async def start_archive_compaction():
+    asyncio.create_task(archive_compaction_loop())
+
 # Authentication endpoints
-@app.post("/auth/register", response_model=RegisterResponse)
+@app.post("/auth/register", response_model=RegisterResponse, dependencies=[Depends(limit_by_client("auth"))])
 async def register(user: UserRegister):
     # Check if user already exists
     existing_user = DatabaseService.get_user_by_email(user.email)
@@ -105,7 +136,7 @@ async def register(user: UserRegister):
     }
 
 
-@app.post("/auth/login", response_model=Token)
+@app.post("/auth/login", response_model=Token, dependencies=[Depends(limit_by_client("auth"))])
 async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     user = authenticate_user(form_data.username, form_data.password)
     if not user:
@@ -121,63 +152,47 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends()):
     return {"access_token": access_token, "token_type": "bearer"}
 
 # User management endpoints
-@app.get("/users/me", response_model=User)
-async def get_current_user_info(current_user: dict = Depends(get_current_user)):
-    return current_user
+@app.get("/users/me", response_model=User, dependencies=[Depends(limit_by_user("read"))])
+async def get_current_user_info(request: Request, current_user: dict = Depends(get_current_user)):
+    return cached_response(request, current_user["id"], "users/me", User, lambda: current_user)
 
-@app.put("/users/me", response_model=User)
+@app.put("/users/me", response_model=User, dependencies=[Depends(limit_by_user("write"))])
 async def update_current_user(user_update: UserBase, current_user: dict = Depends(get_current_user)):
     updated_user = DatabaseService.update_user(current_user["id"], user_update.dict())
+    user_cache.invalidate_user(current_user["id"])
+    response_cache.invalidate(current_user["id"], "users/me")
     return updated_user
 
-@app.delete("/users/me")
+@app.delete("/users/me", dependencies=[Depends(limit_by_user("write"))])
 async def delete_current_user(current_user: dict = Depends(get_current_user)):
     DatabaseService.delete_user(current_user["id"])
+    user_cache.invalidate_user(current_user["id"])
+    response_cache.invalidate(current_user["id"])
     return {"message": "User deleted successfully"}
 
 # Psychologist endpoints
-@app.get("/psychologists/me", response_model=Psychologist)
-async def get_my_psychologist_profile(current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "psychologist":
-        raise HTTPException(status_code=403, detail="Not authorized")
-    psychologist = DatabaseService.get_psychologist_by_user_id(current_user["id"])
-    if not psychologist:
-        raise HTTPException(status_code=404, detail="Psychologist profile not found")
-    return psychologist
-
-@app.put("/psychologists/me", response_model=Psychologist)
-async def update_my_psychologist_profile(psychologist_update: PsychologistBase, current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "psychologist":
-        raise HTTPException(status_code=403, detail="Not authorized")
-    psychologist = DatabaseService.get_psychologist_by_user_id(current_user["id"])
-    if not psychologist:
-        raise HTTPException(status_code=404, detail="Psychologist profile not found")
+@app.get("/psychologists/me", response_model=Psychologist, dependencies=[Depends(limit_by_user("read"))])
+async def get_my_psychologist_profile(request: Request, psychologist: dict = Depends(get_current_psychologist)):
+    return cached_response(request, psychologist["user_id"], "psychologists/me", Psychologist, lambda: psychologist)
+
+@app.put("/psychologists/me", response_model=Psychologist, dependencies=[Depends(limit_by_user("write"))])
+async def update_my_psychologist_profile(psychologist_update: PsychologistBase, psychologist: dict = Depends(get_current_psychologist)):
     updated_psychologist = DatabaseService.update_psychologist(psychologist["id"], psychologist_update.dict())
+    user_cache.invalidate_user(psychologist["user_id"])
+    response_cache.invalidate(psychologist["user_id"], "psychologists/me")
     return updated_psychologist
 
-@app.get("/psychologists/children", response_model=List[Child])
-async def get_my_children(current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "psychologist":
-        raise HTTPException(status_code=403, detail="Not authorized")
-    psychologist = DatabaseService.get_psychologist_by_user_id(current_user["id"])
-    if not psychologist:
-        raise HTTPException(status_code=404, detail="Psychologist profile not found")
+@app.get("/psychologists/children", response_model=List[Child], dependencies=[Depends(limit_by_user("read"))])
+async def get_my_children(psychologist: dict = Depends(get_current_psychologist)):
     children = DatabaseService.get_children_by_psychologist(psychologist["id"])
     return children
 
 
-@app.post("/psychologists/me/children", response_model=Child)
+@app.post("/psychologists/me/children", response_model=Child, dependencies=[Depends(limit_by_user("write"))])
 async def assign_child_to_psychologist(
     assignment: AssignChild,
-    current_user: dict = Depends(get_current_user)
+    psychologist: dict = Depends(get_current_psychologist)
 ):
-    if current_user.get("role") != "psychologist":
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
-
-    psychologist = DatabaseService.get_psychologist_by_user_id(current_user["id"])
-    if not psychologist:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Psychologist profile not found")
-
     # Find the child profile using the user_id from the request
     child_to_assign = DatabaseService.get_child_by_user_id(assignment.child_user_id)
     if not child_to_assign:
@@ -187,73 +202,52 @@ async def assign_child_to_psychologist(
     updated_child = DatabaseService.assign_psychologist_to_child(child_to_assign["id"], psychologist["id"])
     if not updated_child:
         raise HTTPException(status_code=500, detail="Failed to assign child")
+    user_cache.invalidate_user(child_to_assign["user_id"])
+    response_cache.invalidate(child_to_assign["user_id"], "children/me")
 
     return updated_child
 
 
 # Child/Patient endpoints
-@app.get("/children/me", response_model=Child)
-async def get_my_child_profile(current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "child":
-        raise HTTPException(status_code=403, detail="Not authorized")
-    child = DatabaseService.get_child_by_user_id(current_user["id"])
-    if not child:
-        raise HTTPException(status_code=404, detail="Child profile not found")
-    return child
-
-@app.put("/children/me", response_model=Child)
-async def update_my_child_profile(child_update: ChildBase, current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "child":
-        raise HTTPException(status_code=403, detail="Not authorized")
-    child = DatabaseService.get_child_by_user_id(current_user["id"])
-    if not child:
-        raise HTTPException(status_code=404, detail="Child profile not found")
+@app.get("/children/me", response_model=Child, dependencies=[Depends(limit_by_user("read"))])
+async def get_my_child_profile(request: Request, child: dict = Depends(get_current_child)):
+    return cached_response(request, child["user_id"], "children/me", Child, lambda: child)
+
+@app.put("/children/me", response_model=Child, dependencies=[Depends(limit_by_user("write"))])
+async def update_my_child_profile(child_update: ChildBase, child: dict = Depends(get_current_child)):
     updated_child = DatabaseService.update_child(child["id"], child_update.dict())
+    user_cache.invalidate_user(child["user_id"])
+    response_cache.invalidate(child["user_id"], "children/me")
     return updated_child
 
-@app.delete("/children/me")
-async def delete_my_child_profile(current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "child":
-        raise HTTPException(status_code=403, detail="Not authorized")
-    child = DatabaseService.get_child_by_user_id(current_user["id"])
-    if not child:
-        raise HTTPException(status_code=404, detail="Child profile not found")
+@app.delete("/children/me", dependencies=[Depends(limit_by_user("write"))])
+async def delete_my_child_profile(child: dict = Depends(get_current_child)):
     DatabaseService.delete_child(child["id"])
+    user_cache.invalidate_user(child["user_id"])
+    response_cache.invalidate(child["user_id"])
     return {"message": "Child profile deleted successfully"}
 
 # Biometric data endpoints
-@app.post("/biometric-data", response_model=BiometricData)
-async def save_biometric_data(biometric_data: BiometricDataCreate, current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "child":
-        raise HTTPException(status_code=403, detail="Not authorized")
-    child = DatabaseService.get_child_by_user_id(current_user["id"])
-    if not child:
-        raise HTTPException(status_code=404, detail="Child profile not found")
+@app.post("/biometric-data", response_model=BiometricData, dependencies=[Depends(limit_by_user("write"))])
+async def save_biometric_data(biometric_data: BiometricDataCreate, child: dict = Depends(get_current_child)):
     data = biometric_data.dict()
     data["child_id"] = child["id"]
     if not data.get("timestamp"):
         data["timestamp"] = datetime.utcnow()
     saved_data = DatabaseService.save_biometric_data(data)
+    session_registry.record_biometric(child["id"], data["heart_rate"], data["timestamp"])
     return saved_data
 
-@app.get("/biometric-data/history", response_model=List[BiometricData])
-async def get_biometric_history(limit: int = 100, current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "child":
-        raise HTTPException(status_code=403, detail="Not authorized")
-    child = DatabaseService.get_child_by_user_id(current_user["id"])
-    if not child:
-        raise HTTPException(status_code=404, detail="Child profile not found")
+@app.get("/biometric-data/history", response_model=List[BiometricData], dependencies=[Depends(limit_by_user("read"))])
+async def get_biometric_history(limit: int = 100, fields: Optional[str] = None, child: dict = Depends(get_current_child)):
+    selected = parse_fields(fields, BiometricData)
     history = DatabaseService.get_biometric_history(child["id"], limit)
-    return history
+    # Rows come straight from the database, so skip response_model revalidation
+    return FastJSONResponse(project(read_history("biometric_data", child["id"], history, limit), selected))
 
 # Alert endpoints
-@app.post("/alerts", response_model=BiometricAlert)
-async def create_alert(alert: BiometricAlertCreate, current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "child":
-        raise HTTPException(status_code=403, detail="Not authorized")
-    child = DatabaseService.get_child_by_user_id(current_user["id"])
-    if not child:
-        raise HTTPException(status_code=404, detail="Child profile not found")
+@app.post("/alerts", response_model=BiometricAlert, dependencies=[Depends(limit_by_user("write"))])
+async def create_alert(alert: BiometricAlertCreate, child: dict = Depends(get_current_child)):
     data = alert.dict()
     data["child_id"] = child["id"]
     if not data.get("timestamp"):
@@ -261,17 +255,13 @@ async def create_alert(alert: BiometricAlertCreate, current_user: dict = Depends
     saved_alert = DatabaseService.save_alert(data)
     return saved_alert
 
-@app.get("/alerts", response_model=List[BiometricAlert])
-async def get_alerts(current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "child":
-        raise HTTPException(status_code=403, detail="Not authorized")
-    child = DatabaseService.get_child_by_user_id(current_user["id"])
-    if not child:
-        raise HTTPException(status_code=404, detail="Child profile not found")
+@app.get("/alerts", response_model=List[BiometricAlert], dependencies=[Depends(limit_by_user("read"))])
+async def get_alerts(fields: Optional[str] = None, child: dict = Depends(get_current_child)):
+    selected = parse_fields(fields, BiometricAlert)
     alerts = DatabaseService.get_alerts(child["id"])
-    return alerts
+    return FastJSONResponse(project(alerts, selected))
 
-@app.put("/alerts/{alert_id}/resolve")
+@app.put("/alerts/{alert_id}/resolve", dependencies=[Depends(limit_by_user("write"))])
 async def resolve_alert(alert_id: str, current_user: dict = Depends(get_current_user)):
     # Allow both child and psychologist to resolve alerts
     if current_user["role"] not in ["child", "psychologist"]:
@@ -282,91 +272,137 @@ async def resolve_alert(alert_id: str, current_user: dict = Depends(get_current_
     return {"message": "Alert resolved successfully"}
 
 # Emotion record endpoints
-@app.post("/emotion-records", response_model=EmotionRecord)
-async def save_emotion_record(emotion_record: EmotionRecordCreate, current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "child":
-        raise HTTPException(status_code=403, detail="Not authorized")
-    child = DatabaseService.get_child_by_user_id(current_user["id"])
-    if not child:
-        raise HTTPException(status_code=404, detail="Child profile not found")
+@app.post("/emotion-records", response_model=EmotionRecord, dependencies=[Depends(limit_by_user("write"))])
+async def save_emotion_record(emotion_record: EmotionRecordCreate, child: dict = Depends(get_current_child)):
     data = emotion_record.dict()
     data["child_id"] = child["id"]
     if not data.get("timestamp"):
         data["timestamp"] = datetime.utcnow()
     saved_record = DatabaseService.save_emotion_record(data)
+    session_registry.record_emotion(child["id"], data["emotion"], data["intensity"], data["timestamp"])
     return saved_record
 
-@app.get("/emotion-records/history", response_model=List[EmotionRecord])
-async def get_emotion_history(limit: int = 100, current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "child":
-        raise HTTPException(status_code=403, detail="Not authorized")
-    child = DatabaseService.get_child_by_user_id(current_user["id"])
-    if not child:
-        raise HTTPException(status_code=404, detail="Child profile not found")
+@app.get("/emotion-records/history", response_model=List[EmotionRecord], dependencies=[Depends(limit_by_user("read"))])
+async def get_emotion_history(limit: int = 100, fields: Optional[str] = None, child: dict = Depends(get_current_child)):
+    selected = parse_fields(fields, EmotionRecord)
     history = DatabaseService.get_emotion_history(child["id"], limit)
-    return history
+    # Rows come straight from the database, so skip response_model revalidation
+    return FastJSONResponse(project(read_history("emotion_records", child["id"], history, limit), selected))
 
 # Therapy session endpoints
-@app.post("/therapy-sessions", response_model=TherapySession)
-async def create_therapy_session(session: TherapySessionCreate, current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "psychologist":
-        raise HTTPException(status_code=403, detail="Not authorized")
-    psychologist = DatabaseService.get_psychologist_by_user_id(current_user["id"])
-    if not psychologist:
-        raise HTTPException(status_code=404, detail="Psychologist profile not found")
+@app.post("/therapy-sessions", response_model=TherapySession, dependencies=[Depends(limit_by_user("write"))])
+async def create_therapy_session(session: TherapySessionCreate, psychologist: dict = Depends(get_current_psychologist)):
     data = session.dict()
     data["psychologist_id"] = psychologist["id"]
     if not data.get("start_time"):
         data["start_time"] = datetime.utcnow()
     saved_session = DatabaseService.create_therapy_session(data)
+    if saved_session.get("status") == "active":
+        session_registry.start(saved_session)
+    invalidate_child_sessions(saved_session["child_id"])
     return saved_session
 
-@app.put("/therapy-sessions/{session_id}", response_model=TherapySession)
-async def update_therapy_session(session_id: str, session_update: TherapySessionBase, current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "psychologist":
+@app.put("/therapy-sessions/{session_id}", response_model=TherapySession, dependencies=[Depends(limit_by_user("write"))])
+async def update_therapy_session(session_id: str, session_update: TherapySessionUpdate, psychologist: dict = Depends(get_current_psychologist)):
+    # Only the fields the client sent, so a status change keeps objectives and notes
+    data = session_update.dict(exclude_unset=True)
+    session = DatabaseService.get_therapy_session(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Therapy session not found")
+    if str(session["psychologist_id"]) != str(psychologist["id"]):
         raise HTTPException(status_code=403, detail="Not authorized")
-    updated_session = DatabaseService.update_therapy_session(session_id, session_update.dict())
+
+    resumed = None
+    if data.get("status") == "completed":
+        # Freeze the live aggregate into the session row
+        data.setdefault("end_time", datetime.utcnow())
+        aggregate = session_registry.close({**session, **data}, data["end_time"])
+        data["summary"] = jsonable_encoder(aggregate.snapshot(status="completed"))
+    elif data.get("status") == "paused":
+        # Keep the counters so far; samples taken while paused are not added
+        aggregate = session_registry.close(session, datetime.utcnow())
+        data["summary_checkpoint"] = aggregate.checkpoint()
+    elif data.get("status") == "cancelled":
+        session_registry.finish(session_id)
+    elif data.get("status") == "active" and session["status"] != "active":
+        # Continue from the stored checkpoint, whichever worker wrote it
+        resumed_at = datetime.utcnow()
+        resumed = build_aggregate(session)
+        resumed.begin_window(resumed_at)
+        data["summary_checkpoint"] = resumed.checkpoint(resumed_at=resumed_at)
+
+    updated_session = DatabaseService.update_therapy_session(session_id, jsonable_encoder(data))
+    if resumed is not None:
+        session_registry.start(updated_session, resumed)
+    invalidate_child_sessions(updated_session["child_id"])
     return updated_session
 
-@app.get("/therapy-sessions", response_model=List[TherapySession])
-async def get_therapy_sessions(current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "child":
+@app.get("/therapy-sessions/{session_id}/summary", response_model=SessionSummary, dependencies=[Depends(limit_by_user("read"))])
+async def get_therapy_session_summary(session_id: str, psychologist: dict = Depends(get_current_psychologist)):
+    aggregate = session_registry.get(session_id)
+    if aggregate is not None:
+        if aggregate.psychologist_id != str(psychologist["id"]):
+            raise HTTPException(status_code=403, detail="Not authorized")
+        return aggregate.snapshot()
+
+    session = DatabaseService.get_therapy_session(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Therapy session not found")
+    if str(session["psychologist_id"]) != str(psychologist["id"]):
         raise HTTPException(status_code=403, detail="Not authorized")
-    child = DatabaseService.get_child_by_user_id(current_user["id"])
-    if not child:
-        raise HTTPException(status_code=404, detail="Child profile not found")
-    sessions = DatabaseService.get_therapy_sessions(child["id"])
-    return sessions
+    if session["status"] == "completed" and session.get("summary"):
+        return session["summary"]
+    if session["status"] == "active":
+        # Not tracked by this process yet (e.g. after a restart): rebuild once
+        return session_registry.start(session, build_aggregate(session)).snapshot()
+    if session["status"] == "paused":
+        return build_aggregate(session).snapshot()
+    raise HTTPException(status_code=404, detail="No summary available for this session")
+
+@app.get("/therapy-sessions", response_model=List[TherapySession], dependencies=[Depends(limit_by_user("read"))])
+async def get_therapy_sessions(request: Request, child: dict = Depends(get_current_child)):
+    return cached_response(request, child["user_id"], "therapy-sessions", List[TherapySession], lambda: DatabaseService.get_therapy_sessions(child["id"]))
+
+def invalidate_child_sessions(child_id: str):
+    # Sessions are written by the psychologist but cached for the child's user
+    child = DatabaseService.get_child_by_id(child_id)
+    if child:
+        response_cache.invalidate(child["user_id"], "therapy-sessions")
 
 # Emotional island endpoints
-@app.post("/emotional-islands", response_model=EmotionalIsland)
-async def create_emotional_island(island: EmotionalIslandCreate, current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "child":
-        raise HTTPException(status_code=403, detail="Not authorized")
-    child = DatabaseService.get_child_by_user_id(current_user["id"])
-    if not child:
-        raise HTTPException(status_code=404, detail="Child profile not found")
+@app.post("/emotional-islands", response_model=EmotionalIsland, dependencies=[Depends(limit_by_user("write"))])
+async def create_emotional_island(island: EmotionalIslandCreate, child: dict = Depends(get_current_child)):
     data = island.dict()
     data["child_id"] = child["id"]
     saved_island = DatabaseService.create_emotional_island(data)
+    response_cache.invalidate(child["user_id"], "emotional-islands")
     return saved_island
 
-@app.put("/emotional-islands/{island_id}", response_model=EmotionalIsland)
-async def update_emotional_island(island_id: str, island_update: EmotionalIslandBase, current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "child":
-        raise HTTPException(status_code=403, detail="Not authorized")
+@app.put("/emotional-islands/{island_id}", response_model=EmotionalIsland, dependencies=[Depends(limit_by_user("write"))])
+async def update_emotional_island(island_id: str, island_update: EmotionalIslandBase, child: dict = Depends(get_current_child)):
     updated_island = DatabaseService.update_emotional_island(island_id, island_update.dict())
+    response_cache.invalidate(child["user_id"], "emotional-islands")
     return updated_island
 
-@app.get("/emotional-islands", response_model=List[EmotionalIsland])
-async def get_emotional_islands(current_user: dict = Depends(get_current_user)):
-    if current_user["role"] != "child":
-        raise HTTPException(status_code=403, detail="Not authorized")
-    child = DatabaseService.get_child_by_user_id(current_user["id"])
-    if not child:
-        raise HTTPException(status_code=404, detail="Child profile not found")
-    islands = DatabaseService.get_emotional_islands(child["id"])
-    return islands
+@app.get("/emotional-islands", response_model=List[EmotionalIsland], dependencies=[Depends(limit_by_user("read"))])
+async def get_emotional_islands(request: Request, child: dict = Depends(get_current_child)):
+    return cached_response(request, child["user_id"], "emotional-islands", List[EmotionalIsland], lambda: DatabaseService.get_emotional_islands(child["id"]))
+
+# Delta sync endpoint
+@app.post("/sync", response_model=SyncResponse, dependencies=[Depends(limit_by_user("write"))])
+async def sync_child_data(sync_request: SyncRequest, child: dict = Depends(get_current_child)):
+    unknown_tables = set(sync_request.cursors) - set(SYNC_TABLES)
+    if unknown_tables:
+        raise HTTPException(status_code=400, detail=f"Unknown sync tables: {', '.join(sorted(unknown_tables))}")
+    if count_writes(sync_request.writes) > SYNC_MAX_WRITES:
+        raise HTTPException(status_code=413, detail=f"At most {SYNC_MAX_WRITES} writes per sync")
+    limit = max(1, min(sync_request.limit or SYNC_PAGE_SIZE, SYNC_PAGE_SIZE))
+
+    # Writes go first so the pull returns them with their server timestamps
+    rejected = apply_writes(child, sync_request.writes)
+    horizon = settle_horizon()
+    changes = {table: pull_changes(table, child["id"], sync_request.cursors.get(table), limit, horizon) for table in SYNC_TABLES}
+    return FastJSONResponse({"changes": changes, "rejected": rejected, "server_time": datetime.utcnow()})
 
 @app.get("/")
 def read_root():
@@ -375,60 +411,145 @@ def read_root():
     """
     return {"message": "Welcome to the MindBridge API!"}
 
+# No autograd bookkeeping for inference; applies per call, so it holds in the inference workers
+@torch.inference_mode()
+def analyze_frame(data: bytes) -> List[Dict[str, Any]]:
+    # Convert to PIL Image
+    img = Image.open(io.BytesIO(data))
+
+    # --- 1. Face Detection ---
+    boxes, _ = mtcnn.detect(img)
+
+    results = []
+    if boxes is not None:
+        for i, box in enumerate(boxes):
+            face_img = img.crop(box)
+            face_np = np.array(face_img)
+
+            # --- 2. Emotion Recognition ---
+            emotion, scores = fer.predict_emotions(face_np, logits=False)
+
+            results.append({
+                "face_id": i,
+                "box": [int(coord) for coord in box],
+                "emotion": emotion,
+                "scores": scores.tolist()
+            })
+    return results
+
+def analyze_or_reuse(data: bytes, reuse_cache: FrameReuseCache):
+    # Skip detection and classification when the frame has not meaningfully changed
+    signature = frame_signature(data)
+    cached = reuse_cache.lookup(signature)
+    if cached is not None:
+        return cached, True
+    results = analyze_frame(data)
+    reuse_cache.store(signature, results)
+    return results, False
+
 @app.websocket("/ws/analyze")
-async def websocket_endpoint(websocket: WebSocket, current_user: dict = Depends(get_current_user)):
-    await websocket.accept()
+async def websocket_endpoint(websocket: WebSocket, current_user: dict = Depends(get_websocket_user)):
+    await websocket.accept(subprotocol=websocket_subprotocol(websocket))
     print("Client connected to WebSocket.")
+    capture = CaptureController()
+    reuse_cache = FrameReuseCache()
+    # The child profile is resolved with the user when the connection opens
+    child = current_user.get("child") if current_user["role"] == "child" else None
+    if child:
+        live_feed_hub.start_stream(child["id"])
     try:
+        # Tell the client how to capture before the first frame arrives
+        capture.update()
+        await websocket.send_json(capture.pending_message())
+
         while True:
             # Receive image data from the client
             data = await websocket.receive_bytes()
-
-            # Convert to PIL Image
-            img = Image.open(io.BytesIO(data))
-
-            # --- 1. Face Detection ---
-            boxes, _ = mtcnn.detect(img)
-
-            if boxes is not None:
-                results = []
-                for i, box in enumerate(boxes):
-                    face_img = img.crop(box)
-                    face_np = np.array(face_img)
-
-                    # --- 2. Emotion Recognition ---
-                    emotion, scores = fer.predict_emotions(face_np, logits=False)
-
-                    results.append({
-                        "face_id": i,
-                        "box": [int(coord) for coord in box],
-                        "emotion": emotion,
-                        "scores": scores.tolist()
-                    })
-
-                    # Save emotion record to database if user is a child
-                    if current_user["role"] == "child":
-                        child = DatabaseService.get_child_by_user_id(current_user["id"])
-                        if child:
-                            emotion_data = {
-                                "child_id": child["id"],
-                                "emotion": emotion,
-                                "intensity": max(scores) * 100,  # Convert to percentage
-                                "timestamp": datetime.utcnow()
-                            }
-                            DatabaseService.save_emotion_record(emotion_data)
-
-                # Send results back to the client
-                await websocket.send_json({"detections": results})
-            else:
-                # If no face is detected, send an empty list
-                await websocket.send_json({"detections": []})
+            started = now_ms()
+
+            # Shed frames over the user's budget or the node's inference cap;
+            # the client is told how long to back off
+            retry_after = rate_limiter.check(str(current_user["id"]), "frames")
+            if retry_after:
+                await websocket.send_json({"type": "backoff", "reason": "rate_limited", "retry_after_ms": int(retry_after * 1000)})
+                continue
+            if not inference_load.try_acquire(INFERENCE_MAX_PENDING):
+                await websocket.send_json({"type": "backoff", "reason": "overloaded", "retry_after_ms": int(1000 / CAPTURE_PROFILES[-1]["fps"])})
+                # Also step the client down so it stops overshooting
+                capture.update()
+                control = capture.pending_message()
+                if control:
+                    await websocket.send_json(control)
+                continue
+
+            # Run inference on the dedicated pool so queue depth is observable
+            try:
+                results, reused = await run_inference(analyze_or_reuse, data, reuse_cache)
+            finally:
+                inference_load.release()
+
+            # Save emotion records to database if user is a child
+            # (reused detections were already recorded for the original frame)
+            if results and child and not reused:
+                for result in results:
+                    emotion_data = {
+                        "child_id": child["id"],
+                        "emotion": result["emotion"],
+                        "intensity": max(result["scores"]) * 100,  # Convert to percentage
+                        "timestamp": datetime.utcnow()
+                    }
+                    DatabaseService.save_emotion_record(emotion_data)
+                    session_registry.record_emotion(child["id"], emotion_data["emotion"], emotion_data["intensity"], emotion_data["timestamp"])
+
+            # Send results back to the client (empty list if no face is detected)
+            await websocket.send_json({"detections": results, "reused": reused})
+
+            # Push to psychologists watching this child live
+            if child:
+                live_feed_hub.publish(child["id"], detections_event(child["id"], results, reused, datetime.utcnow().isoformat()))
+
+            # Adjust the client's capture settings to the current load
+            capture.record_latency(now_ms() - started)
+            capture.update()
+            control = capture.pending_message()
+            if control:
+                await websocket.send_json(control)
 
     except WebSocketDisconnect:
         print("Client disconnected.")
     except Exception as e:
         print(f"An error occurred: {e}")
         await websocket.close(code=1011)
+    finally:
+        if child:
+            live_feed_hub.end_stream(child["id"])
+
+@app.websocket("/ws/children/{child_id}/live")
+async def child_live_feed(websocket: WebSocket, child_id: str, interval: float = 1.0, current_user: dict = Depends(get_websocket_user)):
+    # Only the psychologist the child is assigned to may watch
+    psychologist = current_user.get("psychologist") if current_user["role"] == "psychologist" else None
+    child = DatabaseService.get_child_by_id(child_id) if psychologist else None
+    if not child or str(child.get("assigned_psychologist")) != str(psychologist["id"]):
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept(subprotocol=websocket_subprotocol(websocket))
+    subscription = live_feed_hub.subscribe(child["id"], interval)
+
+    async def forward():
+        while True:
+            await websocket.send_json(await subscription.queue.get())
+
+    sender = asyncio.create_task(forward())
+    try:
+        # The viewer does not send anything; this only notices the disconnect
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        sender.cancel()
+        live_feed_hub.unsubscribe(subscription)
 
 # To run this application:
 # 1. Make sure you have a virtual environment with the dependencies from requirements.txt installed.
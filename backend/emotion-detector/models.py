@@ -22,11 +22,6 @@ class TokenData(BaseModel):
     email: Optional[str] = None
 
 
-class RegisterResponse(BaseModel):
-    token: Token
-    user: User
-
-
 # User models
 class UserBase(BaseModel):
     name: str
@@ -45,6 +40,11 @@ class User(UserBase):
     class Config:
         from_attributes = True
 
+
+class RegisterResponse(BaseModel):
+    token: Token
+    user: User
+
 # Psychologist models
 class PsychologistBase(BaseModel):
     license_number: str
@@ -106,6 +106,8 @@ class BiometricData(BiometricDataBase):
     child_id: UUID
     timestamp: datetime
     created_at: datetime
+    tier: str = "raw"  # 'raw' for stored rows; 'second' or 'minute' for archived buckets
+    count: int = 1  # raw samples summarised by this row
 
     class Config:
         from_attributes = True
@@ -147,6 +149,8 @@ class EmotionRecord(EmotionRecordBase):
     child_id: UUID
     timestamp: datetime
     created_at: datetime
+    tier: str = "raw"  # 'raw' for stored rows; 'second' or 'minute' for archived buckets
+    count: int = 1  # raw samples summarised by this row
 
     class Config:
         from_attributes = True
@@ -163,6 +167,10 @@ class TherapySessionCreate(TherapySessionBase):
     end_time: Optional[datetime] = None
     status: str = "active"  # 'active', 'paused', 'completed', 'cancelled'
 
+class TherapySessionUpdate(TherapySessionBase):
+    status: Optional[str] = None  # 'active', 'paused', 'completed', 'cancelled'
+    end_time: Optional[datetime] = None
+
 class TherapySession(TherapySessionBase):
     id: UUID
     child_id: UUID
@@ -170,11 +178,40 @@ class TherapySession(TherapySessionBase):
     start_time: datetime
     end_time: Optional[datetime] = None
     status: str
+    summary: Optional[Dict[str, Any]] = None
     created_at: datetime
 
     class Config:
         from_attributes = True
 
+# Session summary models
+class IntensityStats(BaseModel):
+    count: int = 0
+    mean: Optional[float] = None
+    std: Optional[float] = None
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+class HeartRateStats(BaseModel):
+    count: int = 0
+    min: Optional[int] = None
+    mean: Optional[float] = None
+    max: Optional[int] = None
+
+class SessionSummary(BaseModel):
+    session_id: UUID
+    child_id: UUID
+    status: str  # 'active' while live, 'completed' once frozen
+    samples: int = 0
+    dominant_emotion: Optional[str] = None
+    emotion_counts: Dict[str, int] = {}
+    emotion_dwell_seconds: Dict[str, float] = {}
+    transitions: Dict[str, int] = {}
+    transition_count: int = 0
+    intensity: IntensityStats
+    heart_rate: HeartRateStats
+    updated_at: datetime
+
 # Emotional island models
 class EmotionalIslandBase(BaseModel):
     emotion: str  # 'joy', 'sadness', 'anger', 'fear', 'disgust', 'neutral'
@@ -195,3 +232,37 @@ class EmotionalIsland(EmotionalIslandBase):
 
     class Config:
         from_attributes = True
+
+# Delta sync models
+class EmotionalIslandSync(EmotionalIslandBase):
+    id: UUID  # generated by the client, so a retried batch does not duplicate rows
+    last_visit: Optional[datetime] = None
+
+class EmotionRecordSync(EmotionRecordBase):
+    id: UUID
+    timestamp: datetime
+
+class BiometricAlertSync(BiometricAlertBase):
+    id: str
+    timestamp: datetime
+
+class SyncWrites(BaseModel):
+    emotional_islands: List[EmotionalIslandSync] = []  # created or replaced
+    emotion_records: List[EmotionRecordSync] = []
+    biometric_alerts: List[BiometricAlertSync] = []
+    resolved_alerts: List[str] = []
+
+class SyncRequest(BaseModel):
+    cursors: Dict[str, Optional[str]] = {}  # table -> cursor from the previous sync; missing means from the start
+    writes: SyncWrites = SyncWrites()
+    limit: Optional[int] = None  # rows per table, capped by the server
+
+class SyncTableChanges(BaseModel):
+    rows: List[Dict[str, Any]] = []  # recent rows may repeat on the next sync; upsert them by id
+    cursor: Optional[str] = None
+    has_more: bool = False
+
+class SyncResponse(BaseModel):
+    changes: Dict[str, SyncTableChanges]
+    rejected: List[str] = []  # ids of writes that were not applied
+    server_time: datetime
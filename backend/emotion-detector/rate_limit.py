@@ -0,0 +1,97 @@
+import math
+import os
+import threading
+import time
+from typing import Dict, Tuple
+
+from fastapi import Depends, HTTPException, Request
+
+from auth_fixed import get_current_user
+
+# Token bucket budgets per endpoint class: (tokens per second, burst size).
+RATE_LIMITS: Dict[str, Tuple[float, float]] = {
+    # /ws/analyze frames, per user across all of their connections
+    "frames": (float(os.getenv("RATE_LIMIT_FRAMES_PER_SECOND", "15")), float(os.getenv("RATE_LIMIT_FRAMES_BURST", "30"))),
+    # register/login, per client address
+    "auth": (float(os.getenv("RATE_LIMIT_AUTH_PER_SECOND", "0.2")), float(os.getenv("RATE_LIMIT_AUTH_BURST", "5"))),
+    # authenticated REST reads, per user
+    "read": (float(os.getenv("RATE_LIMIT_READ_PER_SECOND", "10")), float(os.getenv("RATE_LIMIT_READ_BURST", "30"))),
+    # authenticated REST writes, per user
+    "write": (float(os.getenv("RATE_LIMIT_WRITE_PER_SECOND", "5")), float(os.getenv("RATE_LIMIT_WRITE_BURST", "20"))),
+}
+# Frames allowed in inference node-wide; beyond this frames are shed with a backoff message.
+INFERENCE_MAX_PENDING = int(os.getenv("INFERENCE_MAX_PENDING", "8"))
+# Buckets untouched for this long are dropped (a refilled bucket carries no state).
+BUCKET_IDLE_SECONDS = 600
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self) -> float:
+        """Consumes a token; returns 0 if allowed, otherwise seconds until one is available."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+
+class RateLimiter:
+    def __init__(self):
+        self._buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def check(self, key: str, endpoint_class: str) -> float:
+        rate, capacity = RATE_LIMITS[endpoint_class]
+        with self._lock:
+            self._sweep()
+            bucket = self._buckets.get((key, endpoint_class))
+            if bucket is None:
+                bucket = self._buckets[(key, endpoint_class)] = TokenBucket(rate, capacity)
+            return bucket.take()
+
+    def _sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < BUCKET_IDLE_SECONDS:
+            return
+        self._last_sweep = now
+        for key in [key for key, bucket in self._buckets.items() if now - bucket.updated > BUCKET_IDLE_SECONDS]:
+            del self._buckets[key]
+
+
+rate_limiter = RateLimiter()
+
+
+def _reject(retry_after: float):
+    raise HTTPException(
+        status_code=429,
+        detail="Too many requests",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+def limit_by_client(endpoint_class: str):
+    """Dependency limiting unauthenticated endpoints per client address."""
+    async def dependency(request: Request):
+        client = request.client.host if request.client else "unknown"
+        retry_after = rate_limiter.check(client, endpoint_class)
+        if retry_after:
+            _reject(retry_after)
+    return dependency
+
+
+def limit_by_user(endpoint_class: str):
+    """Dependency limiting authenticated endpoints per user."""
+    async def dependency(current_user: dict = Depends(get_current_user)):
+        retry_after = rate_limiter.check(str(current_user["id"]), endpoint_class)
+        if retry_after:
+            _reject(retry_after)
+    return dependency
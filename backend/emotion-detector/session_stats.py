@@ -0,0 +1,278 @@
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Set
+
+from archive import parse_timestamp
+from database import DatabaseService
+
+# Gaps between emotion samples longer than this are not counted as dwell time
+# (camera paused, child out of frame, ...).
+SESSION_MAX_DWELL_GAP_SECONDS = float(os.getenv("SESSION_MAX_DWELL_GAP_SECONDS", "5"))
+# How long "this child has no active session" is remembered before asking the database again.
+SESSION_LOOKUP_TTL_SECONDS = float(os.getenv("SESSION_LOOKUP_TTL_SECONDS", "30"))
+# Rows fetched per round trip when rebuilding an aggregate from the raw tables.
+SESSION_SCAN_BATCH_SIZE = 1000
+# Counters saved in therapy_sessions.summary_checkpoint when a session is paused, so
+# resuming (possibly in another process) continues from them instead of rescanning
+# rows recorded while paused.
+CHECKPOINT_FIELDS = (
+    "emotion_counts", "emotion_dwell", "transitions",
+    "intensity_count", "intensity_mean", "intensity_m2", "intensity_min", "intensity_max",
+    "heart_rate_count", "heart_rate_sum", "heart_rate_min", "heart_rate_max",
+)
+
+
+class SessionAggregate:
+    """Running emotional summary of one therapy session, updated per sample in O(1)."""
+
+    def __init__(self, session: Dict[str, Any]):
+        self.session_id = str(session["id"])
+        self.child_id = str(session["child_id"])
+        self.psychologist_id = str(session["psychologist_id"])
+        self.status = session.get("status") or "active"
+        self.start_time = parse_timestamp(session.get("start_time") or datetime.now(timezone.utc))
+
+        self.emotion_counts: Dict[str, int] = {}
+        self.emotion_dwell: Dict[str, float] = {}
+        self.transitions: Dict[str, int] = {}
+        self.last_emotion: Optional[str] = None
+        self.last_emotion_at: Optional[float] = None
+
+        # Welford's running mean/variance for intensity
+        self.intensity_count = 0
+        self.intensity_mean = 0.0
+        self.intensity_m2 = 0.0
+        self.intensity_min: Optional[float] = None
+        self.intensity_max: Optional[float] = None
+
+        self.heart_rate_count = 0
+        self.heart_rate_sum = 0.0
+        self.heart_rate_min: Optional[int] = None
+        self.heart_rate_max: Optional[int] = None
+
+        self.updated_at = self.start_time
+        self.begin_window(self.start_time)
+
+    def begin_window(self, start: Any):
+        """Starts counting the samples added from `start` on, to be checked against the stored rows."""
+        self.window_start = parse_timestamp(start)
+        self.window_emotions = 0
+        self.window_biometrics = 0
+
+    def add_emotion(self, emotion: str, intensity: float, timestamp: Any):
+        ts = parse_timestamp(timestamp)
+        epoch = ts.timestamp()
+
+        self.emotion_counts[emotion] = self.emotion_counts.get(emotion, 0) + 1
+        self.window_emotions += 1
+        if self.last_emotion is not None:
+            gap = epoch - self.last_emotion_at
+            if 0 < gap <= SESSION_MAX_DWELL_GAP_SECONDS:
+                self.emotion_dwell[self.last_emotion] = self.emotion_dwell.get(self.last_emotion, 0.0) + gap
+            if emotion != self.last_emotion:
+                key = f"{self.last_emotion}->{emotion}"
+                self.transitions[key] = self.transitions.get(key, 0) + 1
+        self.last_emotion = emotion
+        self.last_emotion_at = epoch
+
+        self.intensity_count += 1
+        delta = intensity - self.intensity_mean
+        self.intensity_mean += delta / self.intensity_count
+        self.intensity_m2 += delta * (intensity - self.intensity_mean)
+        self.intensity_min = intensity if self.intensity_min is None else min(self.intensity_min, intensity)
+        self.intensity_max = intensity if self.intensity_max is None else max(self.intensity_max, intensity)
+        self.updated_at = max(self.updated_at, ts)
+
+    def add_biometric(self, heart_rate: int, timestamp: Any):
+        self.heart_rate_count += 1
+        self.window_biometrics += 1
+        self.heart_rate_sum += heart_rate
+        self.heart_rate_min = heart_rate if self.heart_rate_min is None else min(self.heart_rate_min, heart_rate)
+        self.heart_rate_max = heart_rate if self.heart_rate_max is None else max(self.heart_rate_max, heart_rate)
+        self.updated_at = max(self.updated_at, parse_timestamp(timestamp))
+
+    def checkpoint(self, resumed_at: Any = None) -> Dict[str, Any]:
+        state = {field: getattr(self, field) for field in CHECKPOINT_FIELDS}
+        state["updated_at"] = self.updated_at.isoformat()
+        state["resumed_at"] = parse_timestamp(resumed_at).isoformat() if resumed_at else None
+        return state
+
+    def restore(self, checkpoint: Dict[str, Any]):
+        for field in CHECKPOINT_FIELDS:
+            value = checkpoint[field]
+            setattr(self, field, dict(value) if isinstance(value, dict) else value)
+        self.updated_at = parse_timestamp(checkpoint["updated_at"])
+        self.begin_window(checkpoint.get("resumed_at") or self.updated_at)
+
+    def matches_database(self, until: Any) -> bool:
+        """Whether the aggregate saw exactly the samples stored for its window up to `until`."""
+        start, end = self.window_start.isoformat(), parse_timestamp(until).isoformat()
+        return (
+            DatabaseService.count_samples_between("emotion_records", self.child_id, start, end) == self.window_emotions
+            and DatabaseService.count_samples_between("biometric_data", self.child_id, start, end) == self.window_biometrics
+        )
+
+    def snapshot(self, status: Optional[str] = None) -> Dict[str, Any]:
+        dominant = max(self.emotion_dwell, key=self.emotion_dwell.get) if self.emotion_dwell else (
+            max(self.emotion_counts, key=self.emotion_counts.get) if self.emotion_counts else None
+        )
+        return {
+            "session_id": self.session_id,
+            "child_id": self.child_id,
+            "status": status or self.status,
+            "samples": self.intensity_count,
+            "dominant_emotion": dominant,
+            "emotion_counts": dict(self.emotion_counts),
+            "emotion_dwell_seconds": {emotion: round(seconds, 3) for emotion, seconds in self.emotion_dwell.items()},
+            "transitions": dict(self.transitions),
+            "transition_count": sum(self.transitions.values()),
+            "intensity": {
+                "count": self.intensity_count,
+                "mean": round(self.intensity_mean, 3) if self.intensity_count else None,
+                "std": round(math.sqrt(self.intensity_m2 / self.intensity_count), 3) if self.intensity_count else None,
+                "min": self.intensity_min,
+                "max": self.intensity_max,
+            },
+            "heart_rate": {
+                "count": self.heart_rate_count,
+                "min": self.heart_rate_min,
+                "mean": round(self.heart_rate_sum / self.heart_rate_count, 3) if self.heart_rate_count else None,
+                "max": self.heart_rate_max,
+            },
+            "updated_at": self.updated_at.isoformat(),
+        }
+
+
+def _scan(fetch, child_id: str, start: str):
+    offset = 0
+    while True:
+        rows = fetch(child_id, start, offset, SESSION_SCAN_BATCH_SIZE)
+        yield from rows
+        if len(rows) < SESSION_SCAN_BATCH_SIZE:
+            return
+        offset += len(rows)
+
+
+def build_aggregate(session: Dict[str, Any]) -> SessionAggregate:
+    """Rebuilds an aggregate from the raw tables (used once per session after a restart)."""
+    aggregate = SessionAggregate(session)
+    start = aggregate.start_time
+    checkpoint = session.get("summary_checkpoint")
+    if checkpoint:
+        aggregate.restore(checkpoint)
+        if not checkpoint.get("resumed_at"):
+            # Still paused: nothing after the checkpoint belongs to the session
+            return aggregate
+        start = parse_timestamp(checkpoint["resumed_at"])
+    start = start.isoformat()
+    end = parse_timestamp(session["end_time"]) if session.get("end_time") else None
+    for row in _scan(DatabaseService.get_emotion_records_since, aggregate.child_id, start):
+        if end and parse_timestamp(row["timestamp"]) > end:
+            break
+        aggregate.add_emotion(row["emotion"], row["intensity"], row["timestamp"])
+    for row in _scan(DatabaseService.get_biometric_data_since, aggregate.child_id, start):
+        if end and parse_timestamp(row["timestamp"]) > end:
+            break
+        aggregate.add_biometric(row["heart_rate"], row["timestamp"])
+    return aggregate
+
+
+class SessionRegistry:
+    """Live aggregates of active sessions, indexed by session and by child."""
+
+    def __init__(self):
+        self._by_session: Dict[str, SessionAggregate] = {}
+        self._by_child: Dict[str, str] = {}
+        # child_id -> time we last found no active session for it
+        self._no_session: Dict[str, float] = {}
+        # Children whose session is being looked up and rebuilt in the background
+        self._loading: Set[str] = set()
+        self._loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="session-loader")
+        self._lock = threading.Lock()
+
+    def start(self, session: Dict[str, Any], aggregate: Optional[SessionAggregate] = None) -> SessionAggregate:
+        aggregate = aggregate or SessionAggregate(session)
+        aggregate.status = "active"
+        with self._lock:
+            self._by_session[aggregate.session_id] = aggregate
+            self._by_child[aggregate.child_id] = aggregate.session_id
+            self._no_session.pop(aggregate.child_id, None)
+        return aggregate
+
+    def get(self, session_id: str) -> Optional[SessionAggregate]:
+        with self._lock:
+            return self._by_session.get(str(session_id))
+
+    def for_child(self, child_id: str) -> Optional[SessionAggregate]:
+        """Returns the child's live aggregate without blocking.
+
+        A child that is not tracked yet gets its session looked up and rebuilt in the
+        background; samples arriving meanwhile are skipped here, the rebuild reads
+        them back from the database.
+        """
+        child_id = str(child_id)
+        with self._lock:
+            session_id = self._by_child.get(child_id)
+            if session_id:
+                return self._by_session[session_id]
+            checked_at = self._no_session.get(child_id)
+            if checked_at is not None and time.time() - checked_at < SESSION_LOOKUP_TTL_SECONDS:
+                return None
+            if child_id in self._loading:
+                return None
+            self._loading.add(child_id)
+        self._loader.submit(self._load, child_id)
+        return None
+
+    def _load(self, child_id: str):
+        try:
+            session = DatabaseService.get_active_therapy_session(child_id)
+            if not session:
+                with self._lock:
+                    self._no_session[child_id] = time.time()
+                return
+            if self.get(session["id"]) is None:
+                self.start(session, build_aggregate(session))
+        except Exception as e:
+            print(f"Could not load the session of child {child_id}: {e}")
+            with self._lock:
+                self._no_session[child_id] = time.time()
+        finally:
+            with self._lock:
+                self._loading.discard(child_id)
+
+    def finish(self, session_id: str) -> Optional[SessionAggregate]:
+        with self._lock:
+            aggregate = self._by_session.pop(str(session_id), None)
+            if aggregate and self._by_child.get(aggregate.child_id) == aggregate.session_id:
+                del self._by_child[aggregate.child_id]
+            return aggregate
+
+    def close(self, session: Dict[str, Any], until: Any) -> SessionAggregate:
+        """Stops tracking the session and returns an aggregate of all its samples up to `until`."""
+        aggregate = self.finish(session["id"])
+        # Another worker may have been fed the camera stream, or samples were skipped
+        # while this one was loading; only an aggregate that saw every stored row is
+        # used as is
+        if aggregate is None or not aggregate.matches_database(until):
+            aggregate = build_aggregate({**session, "end_time": until})
+        return aggregate
+
+    def record_emotion(self, child_id: str, emotion: str, intensity: float, timestamp: Any):
+        aggregate = self.for_child(child_id)
+        if aggregate:
+            with self._lock:
+                aggregate.add_emotion(emotion, intensity, timestamp)
+
+    def record_biometric(self, child_id: str, heart_rate: int, timestamp: Any):
+        aggregate = self.for_child(child_id)
+        if aggregate:
+            with self._lock:
+                aggregate.add_biometric(heart_rate, timestamp)
+
+
+session_registry = SessionRegistry()
@@ -0,0 +1,110 @@
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+
+from archive import parse_timestamp
+from cache import response_cache
+from database import DatabaseService
+from models import SyncWrites
+from session_stats import session_registry
+
+# Tables a child's client keeps a local copy of
+SYNC_TABLES = ("emotional_islands", "therapy_sessions", "biometric_alerts", "emotion_records")
+# Rows returned per table per call; clients call again while has_more is set
+SYNC_PAGE_SIZE = int(os.getenv("SYNC_PAGE_SIZE", "500"))
+# Client writes accepted in a single call
+SYNC_MAX_WRITES = int(os.getenv("SYNC_MAX_WRITES", "500"))
+# updated_at is the writing transaction's start time, so a row can commit after a
+# sync has read past its timestamp. Cursors never move into this recent window;
+# rows inside it are sent again on the next sync (clients upsert by id). Must be
+# longer than the slowest write transaction.
+SYNC_SETTLE_SECONDS = float(os.getenv("SYNC_SETTLE_SECONDS", "10"))
+
+
+def parse_cursor(cursor: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Cursors are '<updated_at>|<id>' of the last row the client received."""
+    if not cursor:
+        return None
+    updated_at, separator, row_id = cursor.rpartition("|")
+    if not separator or not updated_at or not row_id:
+        raise HTTPException(status_code=400, detail="Invalid sync cursor")
+    return updated_at, row_id
+
+
+def settle_horizon() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(seconds=SYNC_SETTLE_SECONDS)
+
+
+def pull_changes(table: str, child_id: str, cursor: Optional[str], limit: int, horizon: datetime) -> Dict[str, Any]:
+    position = parse_cursor(cursor)
+    rows: List[Dict[str, Any]] = []
+    # Rows sharing the cursor's timestamp (e.g. one batch insert) are paged by id,
+    # so a page boundary inside such a group neither repeats nor skips rows
+    if position is not None:
+        rows = DatabaseService.get_rows_updated_at(table, child_id, position[0], position[1], limit + 1)
+    if len(rows) <= limit:
+        since = position[0] if position is not None else None
+        rows += DatabaseService.get_rows_updated_after(table, child_id, since, limit + 1 - len(rows))
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    # Rows are ordered by updated_at, so the settled ones are a prefix
+    settled = [row for row in rows if parse_timestamp(row["updated_at"]) <= horizon]
+    if settled:
+        cursor = f"{settled[-1]['updated_at']}|{settled[-1]['id']}"
+    # Anything after an unsettled row is unsettled too; it comes with a later sync
+    has_more = has_more and len(settled) == len(rows)
+    return {"rows": rows, "cursor": cursor, "has_more": has_more}
+
+
+def count_writes(writes: SyncWrites) -> int:
+    return len(writes.emotional_islands) + len(writes.emotion_records) + len(writes.biometric_alerts) + len(writes.resolved_alerts)
+
+
+def split_by_owner(table: str, rows: List[Dict[str, Any]], child_id: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Splits client rows into those the child may write and the ids already owned by another child."""
+    owners = DatabaseService.get_row_owners(table, [row["id"] for row in rows])
+    accepted = [row for row in rows if owners.get(row["id"], child_id) == child_id]
+    foreign = [row["id"] for row in rows if owners.get(row["id"], child_id) != child_id]
+    return accepted, foreign
+
+
+def apply_writes(child: Dict[str, Any], writes: SyncWrites) -> List[str]:
+    """Applies a batch of offline writes for the child; returns the ids that were rejected."""
+    child_id = str(child["id"])
+    rejected: List[str] = []
+
+    if writes.emotional_islands:
+        islands = [jsonable_encoder({**island.dict(), "child_id": child_id}) for island in writes.emotional_islands]
+        # Never let an upsert take over another child's island
+        accepted, foreign = split_by_owner("emotional_islands", islands, child_id)
+        rejected += foreign
+        if accepted:
+            DatabaseService.upsert_emotional_islands(accepted)
+            response_cache.invalidate(child["user_id"], "emotional-islands")
+
+    if writes.emotion_records:
+        records = [jsonable_encoder({**record.dict(), "child_id": child_id}) for record in writes.emotion_records]
+        # An id another child already uses would otherwise be skipped as a duplicate
+        records, foreign = split_by_owner("emotion_records", records, child_id)
+        rejected += foreign
+        saved = DatabaseService.save_emotion_records(records) if records else []
+        # Only rows stored by this call reach the session aggregate
+        for record in sorted(saved, key=lambda row: row["timestamp"]):
+            session_registry.record_emotion(child_id, record["emotion"], record["intensity"], record["timestamp"])
+
+    if writes.biometric_alerts:
+        alerts = [jsonable_encoder({**alert.dict(), "child_id": child_id}) for alert in writes.biometric_alerts]
+        alerts, foreign = split_by_owner("biometric_alerts", alerts, child_id)
+        rejected += foreign
+        if alerts:
+            DatabaseService.save_alerts(alerts)
+
+    if writes.resolved_alerts:
+        resolved = set(DatabaseService.resolve_child_alerts(child_id, writes.resolved_alerts))
+        rejected += [alert_id for alert_id in writes.resolved_alerts if alert_id not in resolved]
+
+    return rejected
@@ -4,6 +4,7 @@ import { Button } from '@/components/ui/button';
 import { Badge } from '@/components/ui/badge';
 import { Camera, StopCircle, Play, Brain, AlertCircle } from 'lucide-react';
 import { motion } from 'framer-motion';
+import { useAuthStore } from '@/store/authStore';
 
 interface MicroExpression {
   emotion: string;
@@ -11,10 +12,28 @@ interface MicroExpression {
   timestamp: Date;
 }
 
+interface CaptureSettings {
+  fps: number;
+  width: number;
+  height: number;
+  jpeg_quality: number;
+}
+
+// Used until the server sends its first capture_settings message
+const DEFAULT_CAPTURE_SETTINGS: CaptureSettings = {
+  fps: 15,
+  width: 640,
+  height: 480,
+  jpeg_quality: 0.85,
+};
+
 export const CameraAnalysis: React.FC = () => {
   const videoRef = useRef<HTMLVideoElement>(null);
   const canvasRef = useRef<HTMLCanvasElement>(null);
   const animationFrameId = useRef<number>();
+  const captureSettings = useRef<CaptureSettings>(DEFAULT_CAPTURE_SETTINGS);
+  const lastFrameSent = useRef<number>(0);
+  const backoffUntil = useRef<number>(0);
   const [isRecording, setIsRecording] = useState(false);
   const [stream, setStream] = useState<MediaStream | null>(null);
   const [socket, setSocket] = useState<WebSocket | null>(null);
@@ -26,10 +45,21 @@ export const CameraAnalysis: React.FC = () => {
       return;
     }
 
+    // Only send as often as the server asked for
+    const settings = captureSettings.current;
+    const now = performance.now();
+    if (now < backoffUntil.current || now - lastFrameSent.current < 1000 / settings.fps) {
+      animationFrameId.current = requestAnimationFrame(sendFrame);
+      return;
+    }
+    lastFrameSent.current = now;
+
     const video = videoRef.current;
     const canvas = canvasRef.current;
-    canvas.width = video.videoWidth;
-    canvas.height = video.videoHeight;
+    // Downscale to the requested resolution, keeping the video's aspect ratio
+    const scale = Math.min(1, settings.width / video.videoWidth, settings.height / video.videoHeight);
+    canvas.width = Math.round(video.videoWidth * scale);
+    canvas.height = Math.round(video.videoHeight * scale);
     const context = canvas.getContext('2d');
     if (context) {
       context.drawImage(video, 0, 0, canvas.width, canvas.height);
@@ -37,7 +67,7 @@ export const CameraAnalysis: React.FC = () => {
         if (blob && socket && socket.readyState === WebSocket.OPEN) {
           socket.send(blob);
         }
-      }, 'image/jpeg');
+      }, 'image/jpeg', settings.jpeg_quality);
     }
     animationFrameId.current = requestAnimationFrame(sendFrame);
   };
@@ -59,7 +89,10 @@ export const CameraAnalysis: React.FC = () => {
       setStream(mediaStream);
       setIsRecording(true);
       
-      const ws = new WebSocket('ws://127.0.0.1:8000/ws/analyze');
+      // Browsers cannot send an Authorization header on WebSocket handshakes,
+      // so the token travels as a subprotocol instead of in the URL
+      const token = useAuthStore.getState().token;
+      const ws = new WebSocket('ws://127.0.0.1:8000/ws/analyze', token ? ['bearer', token] : undefined);
       
       ws.onopen = () => {
         console.log('WebSocket connected');
@@ -69,6 +102,20 @@ export const CameraAnalysis: React.FC = () => {
 
       ws.onmessage = (event) => {
         const data = JSON.parse(event.data);
+        if (data.type === 'capture_settings') {
+          captureSettings.current = {
+            fps: data.fps,
+            width: data.width,
+            height: data.height,
+            jpeg_quality: data.jpeg_quality,
+          };
+          return;
+        }
+        if (data.type === 'backoff') {
+          // The server shed this frame; pause sending for the requested time
+          backoffUntil.current = performance.now() + data.retry_after_ms;
+          return;
+        }
         if (data.detections && data.detections.length > 0) {
           const mainDetection = data.detections[0];
           const newExpression: MicroExpression = {